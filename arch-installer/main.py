@@ -4,20 +4,49 @@ Arch Linux Installer with Hyprland
 Entry point for the installation system
 """
 
-import sys
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import os
+import re
+import tempfile
 import time
-from utils.system import check_internet_connection, is_uefi, sync_clock, get_available_disks, run_command
-from utils.disk import create_uefi_partitions, create_bios_partitions, format_partitions, mount_partitions, generate_fstab, cleanup_disk
-from utils.chroot import setup_timezone, setup_locales, setup_hostname, setup_network, setup_users, setup_bootloader
-from utils.software import phase3_install_essential_software
-from utils.dotfiles import phase4_dotfiles_and_development
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.system import check_internet_connection, is_uefi, sync_clock, get_available_disks, run_command_async, set_parallel_downloads, rank_mirrors
+from utils.disk import create_partitions, format_partitions, mount_partitions, generate_fstab, cleanup_disk, check_disk_ready
+from utils.chroot import ChrootBatch, enable_locales, enable_wheel_sudo, write_firstboot_settings, write_hosts, clock_commands, locale_commands, user_commands, bootloader_commands
+from utils.software import phase3_install_essential_software, start_package_download, stop_package_download
+from utils.dotfiles import clone_dotfiles, phase4_dotfiles_and_development
+from utils.packages import get_base_packages
 from utils.tui import TUI
+from utils.config import CHROOT_PATH, COMPLETION_PAUSE_MS, LOG_PATH, FALLBACK_LOG_PATH, PACMAN_CONF_PATH, PREFETCH_TIMEOUT, STATE_PATH, STATE_MAX_AGE, STATE_KEYS, TIMEZONE_OPTIONS, TIMEZONE_MAP, LOCALE_OPTIONS, LOCALE_MAP
+
+# Installer settings collected across the interactive steps
+CONFIG_KEYS = ("uefi", "disk", "hostname", "username", "timezone", "locale", "root_password", "user_password")
+
+# pacman drops its "(12/87)" counters when stdout is a pipe, so the total
+# comes from the "Packages (87) ..." line and each "installing foo..." counts one
+PACMAN_TOTAL_RE = re.compile(r'^Packages \((\d+)\)')
+PACMAN_INSTALLING_PREFIX = "installing "
 
 
 class ArchInstaller:
-    def __init__(self):
-        self.config = {}
+    __slots__ = ("config", "tui", "dotfiles_cloned", "pause_ms", "package_download")
+    
+    def __init__(self, pause_ms=COMPLETION_PAUSE_MS):
+        # Every key is known up front, so size the dict once
+        self.config = dict.fromkeys(CONFIG_KEYS)
         self.tui = TUI()
+        self.dotfiles_cloned = False
+        self.pause_ms = pause_ms
+        self.package_download = None
+    
+    def _completion_pause(self):
+        """Let the user see a finished progress screen; any key skips it"""
+        if self.pause_ms > 0:
+            self.tui.wait_key(self.pause_ms)
     
     def welcome_screen(self):
         """Show welcome screen and initial checks"""
@@ -46,68 +75,94 @@ class ArchInstaller:
         """Perform initial system checks"""
         steps = [
             ("Checking internet connection...", "current"),
-            ("Synchronizing system clock...", "pending"),
-            ("Detecting system type...", "pending")
+            ("Synchronizing system clock...", "current"),
+            ("Detecting system type...", "current")
         ]
         
-        self.tui.show_progress("System Checks", steps, step=2, total_steps=12)
-        time.sleep(1)
-        
-        # Check internet
-        if not check_internet_connection():
-            steps[0] = ("Internet connection check", "error")
-            self.tui.show_progress("System Checks", steps, step=2, total_steps=12)
-            self.tui.show_info_screen("Error", ["ERROR: No internet connection detected!",
-                                               "Please connect to the internet and try again."], 
-                                    step=2, total_steps=12)
-            return False
-        
-        steps[0] = ("Internet connection verified", "completed")
-        steps[1] = ("Synchronizing system clock...", "current")
-        self.tui.show_progress("System Checks", steps, step=2, total_steps=12)
-        time.sleep(1)
-        
-        # Sync clock
-        if sync_clock():
-            steps[1] = ("System clock synchronized", "completed")
-        else:
-            steps[1] = ("Clock sync failed (continuing anyway)", "completed")
-        
-        steps[2] = ("Detecting system type...", "current")
-        self.tui.show_progress("System Checks", steps, step=2, total_steps=12)
-        time.sleep(1)
-        
-        # Detect system type
-        self.config['uefi'] = is_uefi()
-        system_type = "UEFI" if self.config['uefi'] else "BIOS"
-        steps[2] = (f"System type detected: {system_type}", "completed")
-        
-        self.tui.show_progress("System Checks", steps, step=2, total_steps=12)
-        time.sleep(1)
+        progress = self.tui.begin_progress("System Checks", steps, step=2, total_steps=12)
+        
+        # Run all checks concurrently and update each row as it finishes
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = {
+                executor.submit(check_internet_connection): 0,
+                executor.submit(sync_clock): 1,
+                executor.submit(is_uefi): 2
+            }
+            
+            for future in as_completed(futures):
+                index = futures[future]
+                result = future.result()
+                
+                if index == 0:
+                    if result:
+                        progress.update(0, "Internet connection verified", "completed")
+                    else:
+                        progress.update(0, "Internet connection check", "error")
+                elif index == 1:
+                    if result:
+                        progress.update(1, "System clock synchronized", "completed")
+                    else:
+                        progress.update(1, "Clock sync failed (continuing anyway)", "completed")
+                else:
+                    self.config['uefi'] = result
+                    system_type = "UEFI" if result else "BIOS"
+                    progress.update(2, f"System type detected: {system_type}", "completed")
+        
+        # Internet is required for everything that follows; the user can
+        # connect from another console and check again without restarting
+        while steps[0][1] == "error":
+            if not self.tui.show_confirmation("No Internet Connection",
+                                              "No internet connection detected! Connect to the internet "
+                                              "(e.g. with iwctl on another console), then choose Yes to check again.",
+                                              step=2, total_steps=12):
+                return False
+            
+            check_internet_connection.cache_clear()
+            steps[0] = ("Checking internet connection...", "current")
+            progress = self.tui.begin_progress("System Checks", steps, step=2, total_steps=12)
+            if check_internet_connection():
+                progress.update(0, "Internet connection verified", "completed")
+            else:
+                progress.update(0, "Internet connection check", "error")
         
         return True
     
     def select_disk(self):
-        """Let user select installation disk"""
+        """Let user select installation disk
+        
+        Returns True once a disk is confirmed, False when the chosen disk was
+        rejected or not confirmed (so another can be picked), and None when
+        there are no disks or the user backs out of the menu.
+        """
         disks = get_available_disks()
         if not disks:
             self.tui.show_info_screen("Error", ["ERROR: No disks found!"], step=3, total_steps=12)
-            return False
+            return None
         
         disk_options = [f"{disk['name']} - {disk['size']} ({disk['model']})" for disk in disks]
         
         choice = self.tui.show_menu("Disk Selection", disk_options, step=3, total_steps=12)
         if choice == -1:
-            return False
+            return None
         
         self.config['disk'] = disks[choice]['name']
         
+        # Reject unusable disks before anything destructive happens
+        ready, reason = check_disk_ready(self.config['disk'])
+        if not ready:
+            # run() shows the menu again; re-read the disks in case the
+            # user swaps or unplugs one in the meantime
+            get_available_disks.cache_clear()
+            self.tui.show_info_screen("Disk Not Usable", [f"ERROR: {reason}"], step=3, total_steps=12)
+            return False
+        
         # Confirm disk selection
         if not self.tui.show_confirmation("Confirm Disk Selection", 
                                         f"Selected disk: {self.config['disk']}\n\n"
                                         "⚠️  ALL DATA on this disk will be PERMANENTLY ERASED!\n\n"
                                         "Are you absolutely sure?", 
                                         default=False):
+            get_available_disks.cache_clear()
             return False
         
         return True
@@ -134,102 +189,61 @@ class ArchInstaller:
     
     def get_timezone(self):
         """Get timezone selection from user"""
-        timezone_options = [
-            "America/New_York (Eastern)",
-            "America/Chicago (Central)", 
-            "America/Denver (Mountain)",
-            "America/Los_Angeles (Pacific)",
-            "Europe/London",
-            "Europe/Berlin",
-            "Asia/Tokyo",
-            "Custom timezone"
-        ]
-        
-        tz_choice = self.tui.show_menu("Select Timezone", timezone_options, step=4, total_steps=12)
+        tz_choice = self.tui.show_menu("Select Timezone", TIMEZONE_OPTIONS, step=4, total_steps=12)
         if tz_choice == -1:
             return None
         
-        if tz_choice == len(timezone_options) - 1:  # Custom
+        if tz_choice == len(TIMEZONE_OPTIONS) - 1:  # Custom
             return self.tui.show_text_input("Custom Timezone", 
                                           "Enter timezone (e.g., Europe/Madrid):", 
                                           step=4, total_steps=12)
         else:
-            tz_map = [
-                "America/New_York", "America/Chicago", "America/Denver", 
-                "America/Los_Angeles", "Europe/London", "Europe/Berlin", "Asia/Tokyo"
-            ]
-            return tz_map[tz_choice]
+            return TIMEZONE_MAP[tz_choice]
     
     def get_locale(self):
         """Get locale selection from user"""
-        locale_options = [
-            "en_US.UTF-8 (English - US)",
-            "en_GB.UTF-8 (English - UK)", 
-            "es_ES.UTF-8 (Spanish - Spain)",
-            "es_MX.UTF-8 (Spanish - Mexico)",
-            "Custom locale"
-        ]
-        
-        locale_choice = self.tui.show_menu("Select Locale", locale_options, step=4, total_steps=12)
+        locale_choice = self.tui.show_menu("Select Locale", LOCALE_OPTIONS, step=4, total_steps=12)
         if locale_choice == -1:
             return None
         
-        if locale_choice == len(locale_options) - 1:  # Custom
+        if locale_choice == len(LOCALE_OPTIONS) - 1:  # Custom
             return self.tui.show_text_input("Custom Locale", 
                                           "Enter locale (e.g., de_DE.UTF-8):", 
                                           step=4, total_steps=12)
         else:
-            locale_map = ["en_US.UTF-8", "en_GB.UTF-8", "es_ES.UTF-8", "es_MX.UTF-8"]
-            return locale_map[locale_choice]
+            return LOCALE_MAP[locale_choice]
     
-    def get_passwords(self):
-        """Get root and user passwords from user"""
-        # Root password
-        while True:
-            root_password = self.tui.show_password_input("Security Configuration", 
-                                                        "Enter root password:", 
-                                                        step=4, total_steps=12)
-            if root_password:
-                # Confirm password
-                confirm_password = self.tui.show_password_input("Security Configuration", 
-                                                              "Confirm root password:", 
-                                                              step=4, total_steps=12)
-                if root_password == confirm_password:
-                    break
-                else:
-                    self.tui.show_info_screen("Password Mismatch", 
-                                            ["ERROR: Passwords do not match!", 
-                                             "Please try again."], 
-                                            step=4, total_steps=12)
-            else:
-                self.tui.show_info_screen("Password Required", 
-                                        ["ERROR: Root password is required!", 
-                                         "Please enter a password."], 
-                                        step=4, total_steps=12)
+    def _prompt_password_twice(self, label):
+        """Prompt for a password until it is entered and confirmed identically"""
+        enter_label = f"Enter {label}:"
+        confirm_label = f"Confirm {label}:"
+        required_lines = [f"ERROR: {label[0].upper()}{label[1:]} is required!", 
+                          "Please enter a password."]
         
-        # User password
         while True:
-            user_password = self.tui.show_password_input("Security Configuration", 
-                                                        f"Enter password for {self.config['username']}:", 
-                                                        step=4, total_steps=12)
-            if user_password:
-                # Confirm password
-                confirm_password = self.tui.show_password_input("Security Configuration", 
-                                                              f"Confirm password for {self.config['username']}:", 
-                                                              step=4, total_steps=12)
-                if user_password == confirm_password:
-                    break
-                else:
-                    self.tui.show_info_screen("Password Mismatch", 
-                                            ["ERROR: Passwords do not match!", 
-                                             "Please try again."], 
-                                            step=4, total_steps=12)
-            else:
-                self.tui.show_info_screen("Password Required", 
-                                        ["ERROR: User password is required!", 
-                                         "Please enter a password."], 
+            password = self.tui.show_password_input("Security Configuration", 
+                                                   enter_label, 
+                                                   step=4, total_steps=12)
+            if not password:
+                self.tui.show_info_screen("Password Required", required_lines, 
                                         step=4, total_steps=12)
-        
+                continue
+            
+            confirm_password = self.tui.show_password_input("Security Configuration", 
+                                                           confirm_label, 
+                                                           step=4, total_steps=12)
+            if hmac.compare_digest(password.encode(), confirm_password.encode()):
+                return password
+            
+            self.tui.show_info_screen("Password Mismatch", 
+                                    ["ERROR: Passwords do not match!", 
+                                     "Please try again."], 
+                                    step=4, total_steps=12)
+    
+    def get_passwords(self):
+        """Get root and user passwords from user"""
+        root_password = self._prompt_password_twice("root password")
+        user_password = self._prompt_password_twice(f"password for {self.config['username']}")
         return root_password, user_password
     
     def basic_config(self):
@@ -261,6 +275,66 @@ class ArchInstaller:
         
         return True
     
+    def _save_state(self):
+        """Atomically save the non-secret configuration for a later resume"""
+        state = {key: self.config[key] for key in STATE_KEYS}
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(STATE_PATH), prefix=".installer-state-")
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, STATE_PATH)
+        except OSError:
+            pass
+    
+    def _load_state(self):
+        """Load configuration saved by a recent session, if any"""
+        try:
+            if time.time() - os.path.getmtime(STATE_PATH) > STATE_MAX_AGE:
+                return None
+            with open(STATE_PATH) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if not isinstance(state, dict) or not all(state.get(key) for key in STATE_KEYS):
+            return None
+        return state
+    
+    def _clear_state(self):
+        """Remove saved configuration once it is no longer needed"""
+        try:
+            os.remove(STATE_PATH)
+        except OSError:
+            pass
+    
+    def resume_session(self):
+        """Offer to reuse the answers from an interrupted session"""
+        state = self._load_state()
+        if not state:
+            return False
+        
+        if not self.tui.show_confirmation("Resume Previous Session", 
+                                        f"Found settings from a previous session:\n\n"
+                                        f"Disk: {state['disk']}, Hostname: {state['hostname']}, "
+                                        f"User: {state['username']}\n\n"
+                                        "Resume with these settings?", 
+                                        default=True):
+            return False
+        
+        ready, reason = check_disk_ready(state['disk'])
+        if not ready:
+            self.tui.show_info_screen("Disk Not Usable", [f"ERROR: {reason}"], step=3, total_steps=12)
+            return False
+        
+        for key in STATE_KEYS:
+            self.config[key] = state[key]
+        
+        # Passwords are never saved, so they are always asked again
+        root_password, user_password = self.get_passwords()
+        self.config['root_password'] = root_password
+        self.config['user_password'] = user_password
+        return True
+    
     def installation_summary(self):
         """Show installation summary and confirm"""
         return self.tui.show_summary("Installation Summary", self.config, step=5, total_steps=12)
@@ -275,69 +349,87 @@ class ArchInstaller:
             ("Generating filesystem table...", "pending")
         ]
         
+        current = 0
         try:
             # Clean up disk first
-            self.tui.show_progress("Installing System", steps, step=6, total_steps=12)
+            progress = self.tui.begin_progress("Installing System", steps, step=6, total_steps=12)
             
             if not cleanup_disk(self.config['disk']):
                 raise Exception("Failed to clean up disk")
             
             # Partition disk
-            if self.config['uefi']:
-                success = create_uefi_partitions(self.config['disk'])
-            else:
-                success = create_bios_partitions(self.config['disk'])
-            
-            if not success:
+            if not create_partitions(self.config['disk'], self.config['uefi']):
                 raise Exception("Failed to create partitions")
             
-            steps[0] = ("Disk partitions created", "completed")
-            steps[1] = ("Formatting partitions...", "current")
-            self.tui.show_progress("Installing System", steps, step=6, total_steps=12)
+            # The disk steps print and let fuser/sgdisk/mkfs/mount write to the terminal
+            progress.repaint()
+            progress.update(0, "Disk partitions created", "completed")
+            current = 1
+            progress.update(1, "Formatting partitions...", "current")
             
             # Format partitions
             if not format_partitions(self.config['disk'], self.config['uefi']):
                 raise Exception("Failed to format partitions")
             
-            steps[1] = ("Partitions formatted", "completed")
-            steps[2] = ("Mounting partitions...", "current")
-            self.tui.show_progress("Installing System", steps, step=6, total_steps=12)
+            progress.repaint()
+            progress.update(1, "Partitions formatted", "completed")
+            current = 2
+            progress.update(2, "Mounting partitions...", "current")
             
             # Mount partitions
             if not mount_partitions(self.config['disk'], self.config['uefi']):
                 raise Exception("Failed to mount partitions")
             
-            steps[2] = ("Partitions mounted", "completed")
-            steps[3] = ("Installing base system (this may take a while)...", "current")
-            self.tui.show_progress("Installing System", steps, step=6, total_steps=12)
+            progress.repaint()
+            progress.update(2, "Partitions mounted", "completed")
+            current = 3
+            progress.update(3, "Ranking mirrors and enabling parallel downloads...", "current")
+            
+            # Download tuning only speeds things up, so failures are not fatal
+            set_parallel_downloads()
+            rank_mirrors()
             
-            # Install base system
-            install_cmd = "pacstrap /mnt base base-devel linux linux-firmware networkmanager grub efibootmgr dialog vim sudo"
-            if not run_command(install_cmd, capture_output=False):
+            progress.update(3, "Installing base system (this may take a while)...", "current")
+            
+            # Install base system, streaming pacstrap output into the progress screen
+            install_cmd = ["pacstrap", "-C", PACMAN_CONF_PATH, "/mnt", *get_base_packages(self.config['uefi'])]
+            
+            total = installed = 0
+            
+            def on_pacstrap_line(line):
+                nonlocal total, installed
+                self.tui.append_log(line)
+                match = PACMAN_TOTAL_RE.match(line)
+                if match:
+                    total = int(match.group(1))
+                elif total and line.startswith(PACMAN_INSTALLING_PREFIX):
+                    installed += 1
+                    progress.update(3, f"Installing base system ({installed}/{total})...", "current")
+            
+            if not asyncio.run(run_command_async(install_cmd, on_line=on_pacstrap_line)):
                 raise Exception("Failed to install base system")
             
-            steps[3] = ("Base system installed", "completed")
-            steps[4] = ("Generating filesystem table...", "current")
-            self.tui.show_progress("Installing System", steps, step=6, total_steps=12)
+            # pacstrap already copied the ranked mirrorlist; carry parallel
+            # downloads over too so Phase 3 installs benefit from it
+            set_parallel_downloads(CHROOT_PATH + PACMAN_CONF_PATH)
+            
+            progress.update(3, "Base system installed", "completed")
+            current = 4
+            progress.update(4, "Generating filesystem table...", "current")
             
             # Generate fstab
             if not generate_fstab():
                 raise Exception("Failed to generate fstab")
             
-            steps[4] = ("Filesystem table created", "completed")
-            self.tui.show_progress("Installing System", steps, step=6, total_steps=12)
+            progress.update(4, "Filesystem table created", "completed")
             
-            time.sleep(2)  # Let user see completion
+            self._completion_pause()
             return True
             
         except Exception as e:
-            error_steps = steps.copy()
-            for i, (desc, status) in enumerate(error_steps):
-                if status == "current":
-                    error_steps[i] = (f"{desc} FAILED", "error")
-                    break
+            steps[current] = (f"{steps[current][0]} FAILED", "error")
             
-            self.tui.show_progress("Installation Failed", error_steps, step=6, total_steps=12)
+            self.tui.show_progress("Installation Failed", steps, step=6, total_steps=12)
             self.tui.show_info_screen("Error", [f"ERROR: {str(e)}"], step=6, total_steps=12)
             return False
     
@@ -366,69 +458,61 @@ class ArchInstaller:
     def phase2_system_configuration(self):
         """Phase 2: System configuration with chroot"""
         steps = [
-            ("Setting up timezone...", "current"),
-            ("Configuring locales...", "pending"),
-            ("Setting hostname and network...", "pending"),
+            ("Writing configuration files...", "current"),
+            ("Syncing hardware clock...", "pending"),
             ("Creating users and passwords...", "pending"),
-            ("Installing bootloader...", "pending")
+            ("Installing bootloader...", "pending"),
+            ("Generating locales and boot menu...", "pending")
         ]
+        completed_labels = [
+            "Configuration files written",
+            "Hardware clock synced",
+            "Users and passwords configured",
+            "Bootloader installed",
+            "Locales and boot menu generated"
+        ]
+        
+        current = 0
+        
+        # Row 0 is the in-process file edits; the batch steps follow it
+        def on_step(index):
+            nonlocal current
+            current = index + 1
+            progress.update(current - 1, completed_labels[current - 1], "completed")
+            progress.update(current, steps[current][0], "current")
         
         try:
-            # Setup timezone
-            self.tui.show_progress("System Configuration", steps, step=7, total_steps=12)
-            
-            if not setup_timezone(self.config['timezone']):
-                raise Exception("Failed to setup timezone")
-            
-            steps[0] = ("Timezone configured", "completed")
-            steps[1] = ("Configuring locales...", "current")
-            self.tui.show_progress("System Configuration", steps, step=7, total_steps=12)
-            
-            # Setup locales
-            if not setup_locales(self.config['locale']):
-                raise Exception("Failed to setup locales")
-            
-            steps[1] = ("Locales configured", "completed")
-            steps[2] = ("Setting hostname and network...", "current")
-            self.tui.show_progress("System Configuration", steps, step=7, total_steps=12)
-            
-            # Setup hostname and network
-            if not setup_hostname(self.config['hostname']):
-                raise Exception("Failed to setup hostname")
-            
-            if not setup_network():
-                raise Exception("Failed to setup network")
-            
-            steps[2] = ("Hostname and network configured", "completed")
-            steps[3] = ("Creating users and passwords...", "current")
-            self.tui.show_progress("System Configuration", steps, step=7, total_steps=12)
-            
-            # Setup users
-            if not setup_users(self.config['username'], self.config['root_password'], self.config['user_password']):
-                raise Exception("Failed to setup users")
-            
-            steps[3] = ("Users and passwords configured", "completed")
-            steps[4] = ("Installing bootloader...", "current")
-            self.tui.show_progress("System Configuration", steps, step=7, total_steps=12)
-            
-            # Setup bootloader
-            if not setup_bootloader(self.config['uefi'], self.config['disk']):
-                raise Exception("Failed to setup bootloader")
-            
-            steps[4] = ("Bootloader installed", "completed")
-            self.tui.show_progress("System Configuration", steps, step=7, total_steps=12)
-            
-            time.sleep(2)
+            progress = self.tui.begin_progress("System Configuration", steps, step=7, total_steps=12)
+            
+            # Plain config file edits happen in-process on the mounted root
+            if not enable_locales(self.config['locale']):
+                raise Exception("Failed to edit locale.gen")
+            if not enable_wheel_sudo():
+                raise Exception("Failed to configure sudo")
+            if not write_firstboot_settings(self.config['timezone'], self.config['hostname'], self.config['locale']):
+                raise Exception("Failed to set timezone, hostname and locale")
+            if not write_hosts(self.config['hostname']):
+                raise Exception("Failed to write hosts file")
+            
+            # All configuration runs through a single chroot shell
+            with ChrootBatch(on_step, on_line=self.tui.append_log) as batch:
+                batch.step(clock_commands())
+                batch.defer(locale_commands())
+                batch.step(user_commands(self.config['username'], self.config['root_password'], self.config['user_password']))
+                batch.step(bootloader_commands(self.config['uefi'], self.config['disk']))
+            
+            if not batch.success:
+                raise Exception("Failed to configure system")
+            
+            progress.update(len(steps) - 1, completed_labels[-1], "completed")
+            
+            self._completion_pause()
             return True
             
         except Exception as e:
-            error_steps = steps.copy()
-            for i, (desc, status) in enumerate(error_steps):
-                if status == "current":
-                    error_steps[i] = (f"{desc} FAILED", "error")
-                    break
+            steps[current] = (f"{steps[current][0]} FAILED", "error")
             
-            self.tui.show_progress("Configuration Failed", error_steps, step=7, total_steps=12)
+            self.tui.show_progress("Configuration Failed", steps, step=7, total_steps=12)
             self.tui.show_info_screen("Error", [f"ERROR: {str(e)}"], step=7, total_steps=12)
             return False
     
@@ -454,9 +538,30 @@ class ArchInstaller:
         
         self.tui.show_info_screen("Phase 2 Complete!", lines, step=8, total_steps=12)
     
+    async def _phase3_with_prefetch(self, username):
+        """Run Phase 3 alongside the order-independent part of Phase 4"""
+        return await asyncio.gather(
+            asyncio.to_thread(phase3_install_essential_software, username),
+            asyncio.to_thread(clone_dotfiles, username)
+        )
+    
     def phase3_software_installation(self):
-        """Phase 3: Install essential software"""
-        if not phase3_install_essential_software(self.config['username']):
+        """Phase 3: Install essential software
+        
+        The dotfiles clone only needs git (installed by pacstrap) and the
+        network, so it overlaps with the package downloads.
+        """
+        # pacman holds a lock on the database; let the prefetch finish first
+        if self.package_download:
+            if self.package_download.poll() is None:
+                self.tui.show_info_screen("Downloading Packages",
+                                          ["Waiting for the background package download to finish..."],
+                                          step=9, total_steps=12, wait_for_key=False)
+            stop_package_download(self.package_download, PREFETCH_TIMEOUT)
+            self.package_download = None
+        
+        installed, self.dotfiles_cloned = asyncio.run(self._phase3_with_prefetch(self.config['username']))
+        if not installed:
             return False
         return True
     
@@ -484,7 +589,7 @@ class ArchInstaller:
     
     def phase4_dotfiles_setup(self):
         """Phase 4: Setup dotfiles and development environment"""
-        if not phase4_dotfiles_and_development(self.config['username']):
+        if not phase4_dotfiles_and_development(self.config['username'], skip_clone=self.dotfiles_cloned):
             return False
         return True
     
@@ -520,11 +625,18 @@ class ArchInstaller:
             if not self.system_checks():
                 return
             
-            if not self.select_disk():
-                return
-            
-            if not self.basic_config():
-                return
+            if not self.resume_session():
+                # A rejected or unconfirmed disk goes back to the disk menu
+                selected = self.select_disk()
+                while selected is False:
+                    selected = self.select_disk()
+                if not selected:
+                    return
+                
+                if not self.basic_config():
+                    return
+                
+                self._save_state()
             
             if not self.installation_summary():
                 return
@@ -532,21 +644,28 @@ class ArchInstaller:
             if not self.install_system():
                 return
             
+            # Phase 3 packages download while Phase 2 runs and its screens are shown
+            self.package_download = start_package_download()
+            
+            self._save_state()
             self.completion()
             
             if not self.phase2_system_configuration():
                 return
             
+            self._save_state()
             self.phase2_completion()
             
             if not self.phase3_software_installation():
                 return
             
+            self._save_state()
             self.phase3_completion()
             
             if not self.phase4_dotfiles_setup():
                 return
             
+            self._clear_state()
             self.phase4_completion()
             
         except KeyboardInterrupt:
@@ -567,11 +686,30 @@ class ArchInstaller:
                 except:
                     print(f"\nUnexpected error: {error_msg}")
         finally:
+            if self.package_download:
+                stop_package_download(self.package_download, 0)
             self.tui.cleanup()
 
 
 def main():
-    installer = ArchInstaller()
+    parser = argparse.ArgumentParser(description="Arch Linux Installer with Hyprland")
+    parser.add_argument("--no-pause", action="store_true",
+                        help="continue immediately after each phase instead of pausing")
+    args = parser.parse_args()
+    
+    # Without any handler, logging's last resort would print warnings
+    # over the TUI, so fall back to /tmp and finally to discarding them
+    for path in (LOG_PATH, FALLBACK_LOG_PATH):
+        try:
+            logging.basicConfig(filename=path, level=logging.DEBUG,
+                                format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+            break
+        except OSError:
+            continue
+    else:
+        logging.getLogger().addHandler(logging.NullHandler())
+    
+    installer = ArchInstaller(pause_ms=0 if args.no_pause else COMPLETION_PAUSE_MS)
     installer.run()
 
 
@@ -3,207 +3,319 @@
 Chroot utilities for system configuration
 """
 
+import logging
+import re
+import shlex
+import shutil
 import subprocess
 from .system import run_command
-from .config import CHROOT_PATH
+from .config import CHROOT_PATH, WHEEL_SUDO_LINE, WHEEL_SUDO_REPLACEMENT, WHEEL_NOPASSWD_LINE
 
+log = logging.getLogger(__name__)
 
-def chroot_command(command):
-    """Execute command in chroot environment"""
-    chroot_cmd = f"arch-chroot {CHROOT_PATH} {command}"
-    print(f"CHROOT: {chroot_cmd}")
-    result = run_command(chroot_cmd, capture_output=False)
-    if result:
-        print("CHROOT: Command completed successfully")
+# Marker echoed by ChrootBatch before each step
+STEP_SENTINEL = "::STEP::"
+
+# Regeneration commands that ChrootBatch runs once, after every edit
+LOCALE_GEN_CMD = "locale-gen"
+GRUB_MKCONFIG_CMD = "grub-mkconfig -o /boot/grub/grub.cfg"
+DEFERRED_COMMANDS = (LOCALE_GEN_CMD, GRUB_MKCONFIG_CMD)
+
+# arch-chroot mounts /proc, /dev, /tmp and friends under the root and
+# unmounts them by path, so two at once would tear down each other's
+# mounts; a private mount namespace per call keeps them apart
+CHROOT_PREFIX = ["unshare", "--mount", "--propagation", "private", "arch-chroot", CHROOT_PATH]
+
+
+def chroot_command(args, capture_output=False):
+    """Execute command (argument list) in chroot environment
+    
+    Output streams straight to the terminal by default, so long installs
+    show live progress and are never buffered in memory; queries pass
+    capture_output=True to get stdout back instead.
+    """
+    chroot_cmd = [*CHROOT_PREFIX, *args]
+    log.debug("CHROOT: %s", shlex.join(chroot_cmd))
+    result = run_command(chroot_cmd, capture_output=capture_output)
+    if result is not None:
+        log.debug("CHROOT: Command completed successfully")
     else:
-        print("CHROOT: Command failed")
+        log.error("CHROOT: Command failed: %s", shlex.join(chroot_cmd))
     return result
 
 
+def user_command(username, args):
+    """Wrap an argument list to run as username inside the chroot
+    
+    runuser switches uid directly, without sudo's PAM session and
+    sudoers evaluation on every call.
+    """
+    return ["runuser", "-u", username, "--", *args]
+
+
+def chroot_which(name):
+    """Resolve a command to its path inside the chroot, or None
+    
+    Looks it up on the mounted root from the host, so no chroot or
+    shell is needed.
+    """
+    search_path = ":".join(CHROOT_PATH + directory for directory in ("/usr/local/bin", "/usr/bin", "/bin"))
+    found = shutil.which(name, path=search_path)
+    if not found:
+        return None
+    return found[len(CHROOT_PATH):]
+
+
+def edit_file(path, transform):
+    """Rewrite a file inside the chroot in-process
+    
+    transform receives the current text and returns the new text; the file
+    is only written when something changed, so edits are safe to repeat.
+    """
+    full_path = CHROOT_PATH + path
+    try:
+        with open(full_path) as f:
+            content = f.read()
+        
+        new_content = transform(content)
+        if new_content != content:
+            with open(full_path, 'w') as f:
+                f.write(new_content)
+    except OSError as e:
+        log.error("Failed to edit %s: %s", path, e)
+        return False
+    return True
+
+
+def write_file(path, content):
+    """Write a whole file inside the chroot in-process"""
+    try:
+        with open(CHROOT_PATH + path, 'w') as f:
+            f.write(content)
+    except OSError as e:
+        log.error("Failed to write %s: %s", path, e)
+        return False
+    return True
+
+
+def _replace_line(content, old_line, new_line):
+    """Replace every line equal to old_line"""
+    return "\n".join(new_line if line == old_line else line for line in content.split("\n"))
+
+
+def _ensure_line(content, line):
+    """Append line unless it is already present"""
+    if line in content.split("\n"):
+        return content
+    if content and not content.endswith("\n"):
+        content += "\n"
+    return content + line + "\n"
+
+
+def _remove_line(content, line):
+    """Drop every line equal to line"""
+    return "\n".join(existing for existing in content.split("\n") if existing != line)
+
+
 def execute_step(description, command, error_msg=None):
     """Execute a chroot step with consistent logging and error handling"""
-    print(f"{description}...")
+    log.info("%s...", description)
     if not chroot_command(command):
         error_message = error_msg or f"Failed: {description}"
-        print(f"ERROR: {error_message}")
+        log.error(error_message)
         return False
-    print(f"✓ {description} completed successfully")
+    log.info("%s completed successfully", description)
     return True
 
 
-def setup_timezone(timezone):
-    """Configure system timezone"""
-    print(f"Setting timezone to: {timezone}")
+class ChrootBatch:
+    """Accumulate shell commands and run them in a single chroot shell
     
-    # Set timezone
-    if not chroot_command(f"ln -sf /usr/share/zoneinfo/{timezone} /etc/localtime"):
-        return False
+    Commands are grouped into steps; a sentinel line is echoed before each
+    step so on_step is called with the step index as soon as the shell
+    reaches it. Other output goes to on_line, or the debug log if none is
+    given. The script runs under `set -euo pipefail`, so on failure the
+    last reported index is the step that failed. Deferred regeneration
+    commands run once, in one extra step at the end. The batch runs when
+    the with-block exits without an exception and stores the outcome in
+    success.
+    """
     
-    # Set hardware clock
-    if not chroot_command("hwclock --systohc"):
-        return False
+    def __init__(self, on_step=None, on_line=None):
+        self.lines = ["set -euo pipefail"]
+        self.deferred = []
+        self.step_count = 0
+        self.on_step = on_step
+        self.on_line = on_line
+        self.success = None
     
-    print("Timezone configured successfully")
-    return True
-
-
-def setup_locales(locale):
-    """Configure system locales"""
-    print(f"Setting up locale: {locale}")
+    def __enter__(self):
+        return self
     
-    # Uncomment locale in locale.gen
-    sed_cmd = f"sed -i 's/#{locale}/{locale}/' /etc/locale.gen"
-    if not chroot_command(sed_cmd):
-        print("Failed to edit locale.gen")
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.success = self.run()
         return False
     
-    # Also enable en_US.UTF-8 as fallback
-    if locale != "en_US.UTF-8":
-        fallback_cmd = "sed -i 's/#en_US.UTF-8/en_US.UTF-8/' /etc/locale.gen"
-        if not chroot_command(fallback_cmd):
-            print("Failed to enable en_US.UTF-8 fallback")
-            return False
+    def step(self, commands):
+        """Start a new step made of the given commands
+        
+        Regeneration commands listed in DEFERRED_COMMANDS are held back and
+        run once, as a final extra step, after every other edit.
+        """
+        self.defer([command for command in commands if command in DEFERRED_COMMANDS])
+        self._append_step([command for command in commands if command not in DEFERRED_COMMANDS])
     
-    # Generate locales
-    if not chroot_command("locale-gen"):
-        print("Failed to generate locales")
-        return False
+    def defer(self, commands):
+        """Queue commands for the final extra step without starting a step"""
+        for command in commands:
+            if command not in self.deferred:
+                self.deferred.append(command)
     
-    # Set LANG variable
-    if not chroot_command(f"bash -c \"echo 'LANG={locale}' > /etc/locale.conf\""):
-        print("Failed to set LANG in locale.conf")
-        return False
+    def _append_step(self, commands):
+        """Add a sentinel and the commands to the script as-is"""
+        self.lines.append(f"echo '{STEP_SENTINEL}{self.step_count}'")
+        self.lines.extend(commands)
+        self.step_count += 1
     
-    print("Locales configured successfully")
-    return True
+    def run(self):
+        """Pipe the accumulated script through one arch-chroot bash"""
+        if self.deferred:
+            self._append_step(self.deferred)
+            self.deferred = []
+        script = "\n".join(self.lines) + "\n"
+        
+        log.debug("CHROOT: running %d steps in a single shell", self.step_count)
+        try:
+            process = subprocess.Popen(
+                [*CHROOT_PREFIX, "bash", "-s"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True
+            )
+        except OSError as e:
+            log.error("CHROOT: Failed to start arch-chroot: %s", e)
+            return False
+        
+        process.stdin.write(script)
+        process.stdin.close()
+        
+        for line in process.stdout:
+            if line.startswith(STEP_SENTINEL):
+                if self.on_step:
+                    self.on_step(int(line[len(STEP_SENTINEL):]))
+            elif self.on_line:
+                self.on_line(line.rstrip())
+            else:
+                log.debug(line.rstrip())
+        
+        if process.wait() != 0:
+            log.error("CHROOT: Script failed")
+            return False
+        log.debug("CHROOT: Script completed successfully")
+        return True
 
 
-def setup_hostname(hostname):
-    """Configure system hostname"""
-    print(f"Setting hostname: {hostname}")
-    
-    # Set hostname
-    if not chroot_command(f"bash -c \"echo '{hostname}' > /etc/hostname\""):
-        print("Failed to set hostname")
-        return False
-    
-    # Configure hosts file
-    hosts_content = f"""127.0.0.1	localhost
-::1		localhost
-127.0.1.1	{hostname}.localdomain	{hostname}"""
-    
-    hosts_cmd = f"bash -c \"cat > /etc/hosts << 'EOF'\n{hosts_content}\nEOF\""
-    if not chroot_command(hosts_cmd):
-        print("Failed to configure hosts file")
-        return False
+def write_firstboot_settings(timezone, hostname, locale):
+    """Write /etc/localtime, /etc/hostname and /etc/locale.conf in one call
     
-    print("Hostname configured successfully")
-    return True
+    systemd-firstboot runs on the host against the mounted root, so no
+    chroot is needed; --force replaces whatever pacstrap left behind.
+    """
+    return run_command([
+        "systemd-firstboot",
+        f"--root={CHROOT_PATH}",
+        f"--timezone={timezone}",
+        f"--hostname={hostname}",
+        f"--locale={locale}",
+        "--force"
+    ]) is not None
 
 
-def setup_network():
-    """Configure network services"""
-    print("Configuring network services...")
-    
-    # Network services will be enabled later via SYSTEM_SERVICES
-    print("Network services configured successfully")
-    return True
+def clock_commands():
+    """Commands to sync the hardware clock (write_firstboot_settings sets the zone)"""
+    return [
+        "hwclock --systohc"
+    ]
 
 
-def setup_users(username, root_password, user_password):
-    """Configure root password and create user"""
-    print("Setting up users...")
+def enable_locales(locale):
+    """Uncomment the locale, plus the en_US.UTF-8 fallback, in /etc/locale.gen"""
+    def transform(content):
+        for name in {locale, "en_US.UTF-8"}:
+            content = re.sub(rf'^#({re.escape(name)}\s)', r'\1', content, flags=re.MULTILINE)
+        return content
     
-    # Set root password
-    print("Setting root password...")
-    cmd = f"bash -c \"echo 'root:{root_password}' | chpasswd\""
-    print(f"Executing: {cmd}")
-    if not chroot_command(cmd):
-        print("ERROR: Failed to set root password")
-        return False
-    print("Root password set successfully")
-    
-    # Create user
-    print(f"Creating user: {username}")
-    cmd = f"useradd -m -G wheel,audio,video,optical,storage -s /bin/bash {username}"
-    print(f"Executing: {cmd}")
-    if not chroot_command(cmd):
-        print(f"ERROR: Failed to create user: {username}")
-        return False
-    print(f"User {username} created successfully")
-    
-    # Set user password
-    print(f"Setting password for user: {username}")
-    cmd = f"bash -c \"echo '{username}:{user_password}' | chpasswd\""
-    print(f"Executing: {cmd}")
-    if not chroot_command(cmd):
-        print(f"ERROR: Failed to set password for user: {username}")
-        return False
-    print(f"Password for {username} set successfully")
+    return edit_file("/etc/locale.gen", transform)
+
+
+def enable_wheel_sudo():
+    """Let the wheel group use sudo"""
+    return edit_file("/etc/sudoers", lambda content: _replace_line(content, WHEEL_SUDO_LINE, WHEEL_SUDO_REPLACEMENT))
+
+
+def locale_commands():
+    """Commands to generate locales (enable_locales must run first)
     
-    # Configure sudo
-    print("Configuring sudo access...")
-    sudo_cmd = "sed -i 's/# %wheel ALL=(ALL:ALL) ALL/%wheel ALL=(ALL:ALL) ALL/' /etc/sudoers"
-    if not chroot_command(sudo_cmd):
-        print("Failed to configure sudo")
-        return False
+    locale-gen is deferred, so pass these to ChrootBatch.defer.
+    """
+    return [
+        LOCALE_GEN_CMD
+    ]
+
+
+def write_hosts(hostname):
+    """Write /etc/hosts (write_firstboot_settings sets the hostname itself)"""
+    hosts_content = f"""127.0.0.1	localhost
+::1		localhost
+127.0.1.1	{hostname}.localdomain	{hostname}
+"""
     
-    print("Users configured successfully")
-    return True
+    return write_file("/etc/hosts", hosts_content)
+
+
+def user_commands(username, root_password, user_password):
+    """Commands to set root password and create user"""
+    credentials = " ".join(shlex.quote(entry) for entry in (f"root:{root_password}", f"{username}:{user_password}"))
+    # printf is a shell builtin, so passwords never appear in a process argv;
+    # chpasswd takes one user:password per line, so both go in one call
+    return [
+        f"useradd -m -G wheel,audio,video,optical,storage -s /bin/bash {shlex.quote(username)}",
+        f"printf '%s\\n' {credentials} | chpasswd"
+    ]
 
 
 def enable_nopasswd_for_installation():
     """Temporarily enable NOPASSWD for package installation during setup"""
-    print("Temporarily enabling NOPASSWD for AUR installation...")
-    nopasswd_cmd = 'bash -c "echo \'%wheel ALL=(ALL:ALL) NOPASSWD: /usr/bin/pacman, /usr/bin/makepkg\' >> /etc/sudoers"'
-    if not chroot_command(nopasswd_cmd):
-        print("Failed to configure temporary NOPASSWD")
+    log.info("Temporarily enabling NOPASSWD for AUR installation...")
+    if not edit_file("/etc/sudoers", lambda content: _ensure_line(content, WHEEL_NOPASSWD_LINE)):
+        log.error("Failed to configure temporary NOPASSWD")
         return False
     return True
 
 
 def disable_nopasswd_after_installation():
     """Remove NOPASSWD configuration after installation is complete"""
-    print("Removing temporary NOPASSWD configuration...")
+    log.info("Removing temporary NOPASSWD configuration...")
     # Remove the NOPASSWD line we added
-    remove_cmd = "sed -i '/%wheel ALL=(ALL:ALL) NOPASSWD: \/usr\/bin\/pacman, \/usr\/bin\/makepkg/d' /etc/sudoers"
-    if not chroot_command(remove_cmd):
-        print("Warning: Failed to remove NOPASSWD configuration")
+    if not edit_file("/etc/sudoers", lambda content: _remove_line(content, WHEEL_NOPASSWD_LINE)):
+        log.warning("Failed to remove NOPASSWD configuration")
         return False
-    print("NOPASSWD configuration removed successfully")
+    log.info("NOPASSWD configuration removed successfully")
     return True
 
 
-def setup_bootloader(is_uefi, disk_path=None):
-    """Install and configure GRUB bootloader"""
-    print("Setting up GRUB bootloader...")
-    
+def bootloader_commands(is_uefi, disk_path=None):
+    """Commands to install and configure GRUB bootloader"""
     if is_uefi:
-        print("Configuring GRUB for UEFI...")
-        
-        # Install GRUB for UEFI
         grub_install_cmd = "grub-install --target=x86_64-efi --efi-directory=/boot --bootloader-id=GRUB"
-        if not chroot_command(grub_install_cmd):
-            print("Failed to install GRUB for UEFI")
-            return False
     else:
-        print("Configuring GRUB for BIOS...")
-        
         if not disk_path:
-            print("Error: disk path required for BIOS installation")
-            return False
-        
-        # Install GRUB for BIOS
+            raise ValueError("disk path required for BIOS installation")
         grub_install_cmd = f"grub-install --target=i386-pc {disk_path}"
-        if not chroot_command(grub_install_cmd):
-            print("Failed to install GRUB for BIOS")
-            return False
-    
-    # Generate GRUB configuration
-    print("Generating GRUB configuration...")
-    if not chroot_command("grub-mkconfig -o /boot/grub/grub.cfg"):
-        print("Failed to generate GRUB configuration")
-        return False
     
-    print("GRUB bootloader configured successfully")
-    return True
\ No newline at end of file
+    return [
+        grub_install_cmd,
+        GRUB_MKCONFIG_CMD
+    ]
@@ -8,21 +8,89 @@ CHROOT_PATH = "/mnt"
 BOOT_PATH = "/boot"
 HOME_PATH_TEMPLATE = "/home/{username}"
 
+# Diagnostic log, kept off the terminal so it does not fight the TUI
+LOG_PATH = "/var/log/arch-installer.log"
+FALLBACK_LOG_PATH = "/tmp/arch-installer.log"
+
+# Saved answers from an interrupted session (passwords are never written)
+STATE_PATH = "/tmp/installer-state.json"
+STATE_MAX_AGE = 3600
+STATE_KEYS = ("disk", "hostname", "username", "timezone", "locale")
+
+# Smallest disk accepted as an installation target
+MIN_DISK_SIZE_BYTES = 20 * 1024**3
+
+# Filesystem label prefix used by Arch ISO media
+ARCH_ISO_LABEL_PREFIX = "ARCH_"
+
+# Internet check: the hostname must answer, which also proves DNS works;
+# the raw addresses only let the check fail fast when nothing is reachable
+CONNECTIVITY_HOST = ("archlinux.org", 443)
+CONNECTIVITY_ENDPOINTS = [
+    ("1.1.1.1", 443),
+    ("8.8.8.8", 443)
+]
+CONNECTIVITY_TIMEOUT = 2
+
+# Pacman tuning applied before downloading packages
+PACMAN_CONF_PATH = "/etc/pacman.conf"
+MIRRORLIST_PATH = "/etc/pacman.d/mirrorlist"
+PACMAN_DB_PATH = "/var/lib/pacman"
+PACMAN_LOCAL_DB_PATH = "/var/lib/pacman/local"
+PACMAN_CACHE_PATH = "/var/cache/pacman/pkg"
+PARALLEL_DOWNLOADS = 10
+REFLECTOR_ARGS = ["--latest", "20", "--protocol", "https", "--sort", "rate"]
+REFLECTOR_TIMEOUT = 120
+
+# Background Phase 3 download: how long Phase 3 waits for it before stopping
+# it (pacman -S fetches whatever is missing), and the grace period after SIGTERM
+PREFETCH_TIMEOUT = 600
+PREFETCH_STOP_TIMEOUT = 10
+
 # Command flags
-PACMAN_FLAGS = "--needed --noconfirm"
-YAY_FLAGS = "-S --needed --noconfirm"
-MAKEPKG_FLAGS = "-si --noconfirm"
+PACMAN_FLAGS = ["--needed", "--noconfirm"]
+YAY_FLAGS = ["-S", "--needed", "--noconfirm"]
+MAKEPKG_FLAGS = ["-si", "--noconfirm"]
+GIT_CLONE_FLAGS = ["--depth=1", "--single-branch"]
 
 # Git repositories
 OH_MY_ZSH_REPO = "https://github.com/ohmyzsh/ohmyzsh"
 YAY_REPO = "https://aur.archlinux.org/yay.git"
 
+# How long finished progress screens stay up (any key skips)
+COMPLETION_PAUSE_MS = 2000
+
 # Default system configuration
 DEFAULT_LOCALE = "en_US.UTF-8"
 DEFAULT_TIMEZONE = "America/New_York"
 DEFAULT_HOSTNAME = "arch"
 DEFAULT_USERNAME = "user"
 
+# Timezone and locale menus (the last option is always "Custom ...")
+TIMEZONE_OPTIONS = (
+    "America/New_York (Eastern)",
+    "America/Chicago (Central)",
+    "America/Denver (Mountain)",
+    "America/Los_Angeles (Pacific)",
+    "Europe/London",
+    "Europe/Berlin",
+    "Asia/Tokyo",
+    "Custom timezone"
+)
+TIMEZONE_MAP = (
+    "America/New_York", "America/Chicago", "America/Denver",
+    "America/Los_Angeles", "Europe/London", "Europe/Berlin", "Asia/Tokyo"
+)
+
+LOCALE_OPTIONS = (
+    "en_US.UTF-8 (English - US)",
+    "en_GB.UTF-8 (English - UK)",
+    "es_ES.UTF-8 (Spanish - Spain)",
+    "es_MX.UTF-8 (Spanish - Mexico)",
+    "Custom locale"
+)
+LOCALE_MAP = ("en_US.UTF-8", "en_GB.UTF-8", "es_ES.UTF-8", "es_MX.UTF-8")
+
 # Service names
 SYSTEM_SERVICES = [
     'sddm',           # Display manager
@@ -3,46 +3,137 @@
 Disk partitioning and formatting utilities
 """
 
+import fcntl
+import functools
+import os
 import subprocess
 import time
-from .system import run_command
+from .system import run_command, get_mounts, get_partitions
+from .config import CHROOT_PATH, MIN_DISK_SIZE_BYTES, ARCH_ISO_LABEL_PREFIX
 
+# Seconds to wait for a single mkfs before giving up
+MKFS_TIMEOUT = 300
 
+# ioctl request to re-read a block device's partition table (linux/fs.h)
+BLKRRPART = 0x125F
+
+# Upper bound, in seconds, for udev to finish processing block device events
+UDEV_SETTLE_TIMEOUT = 10
+
+
+def read_block_attribute(disk, attribute):
+    """Read /sys/block/<disk>/<attribute>, or None if it is not available"""
+    try:
+        with open(f"/sys/block/{os.path.basename(disk)}/{attribute}") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def get_disk_size(disk):
+    """Disk capacity in bytes from sysfs, or None if unknown"""
+    # sysfs counts 512-byte sectors regardless of the device's block size
+    sectors = read_block_attribute(disk, "size")
+    try:
+        return int(sectors) * 512
+    except (TypeError, ValueError):
+        return None
+
+
+@functools.lru_cache(maxsize=1)
+def _blkid_table():
+    """Probe every block device once, as {device: {TAG: value}}
+    
+    Cached until cleanup_disk changes the signatures; -c /dev/null makes
+    blkid probe the devices instead of trusting its own cache file.
+    """
+    output = run_command(["blkid", "-c", "/dev/null", "-o", "export"], capture_output=True)
+    table = {}
+    for block in (output or "").split("\n\n"):
+        tags = dict(line.split("=", 1) for line in block.split("\n") if "=" in line)
+        if "DEVNAME" in tags:
+            table[tags.pop("DEVNAME")] = tags
+    return table
+
+
+def _disk_devices(disk):
+    """Paths of the disk and its partitions
+    
+    Matched exactly: a prefix test would also take /dev/nvme0n10 for
+    /dev/nvme0n1 or /dev/mmcblk0boot0 for /dev/mmcblk0.
+    """
+    return {disk, *get_partitions(disk)}
+
+
+def _disk_tags(devices):
+    """blkid tags of the given devices"""
+    table = _blkid_table()
+    return [table[device] for device in devices if device in table]
+
+
+@functools.lru_cache(maxsize=None)
 def is_iso_device(disk):
     """Check if disk is the current Arch ISO device"""
     print(f"Checking if {disk} is the ISO device...")
     
+    devices = _disk_devices(disk)
+    
     # Check if any partition of this disk is mounted as archiso
-    mount_output = run_command("mount | grep archiso", capture_output=True)
-    if mount_output and disk in mount_output:
-        print(f"WARNING: {disk} appears to be the Arch ISO device")
-        return True
+    for device, mountpoint, _ in get_mounts():
+        if device in devices and 'archiso' in mountpoint:
+            print(f"WARNING: {disk} appears to be the Arch ISO device")
+            return True
     
     # Check for ISO 9660 filesystem (common for ISO images)
-    blkid_output = run_command(f"blkid {disk}*", capture_output=True)
-    if blkid_output and ("iso9660" in blkid_output.lower() or "archiso" in blkid_output.lower()):
-        print(f"WARNING: {disk} contains ISO filesystem")
-        return True
+    for tags in _disk_tags(devices):
+        values = " ".join(tags.values()).lower()
+        if "iso9660" in values or "archiso" in values:
+            print(f"WARNING: {disk} contains ISO filesystem")
+            return True
     
     # Check if it's a removable device that might be the USB
-    removable_check = run_command(f"cat /sys/block/{disk.split('/')[-1]}/removable 2>/dev/null", capture_output=True)
-    if removable_check == "1":
+    if read_block_attribute(disk, "removable") == "1":
         # It's removable, check size (USB sticks are usually smaller)
-        size_output = run_command(f"lsblk -b -o SIZE -n {disk}", capture_output=True)
-        if size_output:
-            try:
-                size_bytes = int(size_output.strip())
-                size_gb = size_bytes / (1024**3)
-                # Typical Arch ISO is around 1-2GB, USB sticks are often 4-32GB
-                if size_gb < 64:  # Likely a USB stick
-                    print(f"WARNING: {disk} is a small removable device ({size_gb:.1f}GB)")
-                    return True
-            except:
-                pass
+        size_bytes = get_disk_size(disk)
+        if size_bytes is not None:
+            size_gb = size_bytes / (1024**3)
+            # Typical Arch ISO is around 1-2GB, USB sticks are often 4-32GB
+            if size_gb < 64:  # Likely a USB stick
+                print(f"WARNING: {disk} is a small removable device ({size_gb:.1f}GB)")
+                return True
     
     return False
 
 
+def check_disk_ready(disk):
+    """Pre-flight checks before any destructive operation on the disk
+    
+    Returns (True, "") when the disk can be used, otherwise (False, reason).
+    """
+    size_bytes = get_disk_size(disk)
+    if size_bytes is None:
+        return False, f"Could not read size of {disk}"
+    
+    if size_bytes < MIN_DISK_SIZE_BYTES:
+        return False, f"{disk} is too small ({size_bytes / 1024**3:.1f}GB, need {MIN_DISK_SIZE_BYTES // 1024**3}GB)"
+    
+    devices = _disk_devices(disk)
+    
+    # Mounts under the chroot path are left over from a previous attempt
+    # and are released by cleanup_disk; anything else is in use by the live system
+    for device, mountpoint, _ in get_mounts():
+        if device in devices and not (mountpoint == CHROOT_PATH or mountpoint.startswith(CHROOT_PATH + '/')):
+            return False, f"{device} is mounted at {mountpoint}"
+    
+    # The install medium itself carries an ARCH_YYYYMM label; probe afresh
+    # since this check gates a destructive operation
+    _blkid_table.cache_clear()
+    if any(tags.get("LABEL", "").startswith(ARCH_ISO_LABEL_PREFIX) for tags in _disk_tags(devices)):
+        return False, f"{disk} is the Arch installation medium"
+    
+    return True, ""
+
+
 def get_safe_disks():
     """Get list of disks that are safe to use (not ISO device)"""
     from .system import get_available_disks
@@ -59,91 +150,124 @@ def get_safe_disks():
     return safe_disks
 
 
+def reread_partition_table(disk, attempts=5):
+    """Ask the kernel to re-read the partition table with the BLKRRPART ioctl
+    
+    The ioctl fails with EBUSY while the kernel still holds the old
+    partitions, so it is retried with a one second backoff.
+    """
+    for attempt in range(attempts):
+        try:
+            fd = os.open(disk, os.O_RDONLY)
+            try:
+                fcntl.ioctl(fd, BLKRRPART)
+            finally:
+                os.close(fd)
+            return True
+        except OSError as e:
+            print(f"Partition table re-read failed ({e.strerror}), attempt {attempt + 1}/{attempts}")
+            if attempt < attempts - 1:
+                time.sleep(1)
+    return False
+
+
+def settle_udev():
+    """Wait until udev has processed all queued events (returns as soon as it has)"""
+    return run_command(["udevadm", "settle", f"--timeout={UDEV_SETTLE_TIMEOUT}"], capture_output=False)
+
+
+def is_rotational(disk):
+    """True for spinning disks, False for SSDs, None if unknown"""
+    rotational = read_block_attribute(disk, "queue/rotational")
+    if rotational is None:
+        return None
+    return rotational == "1"
+
+
 def cleanup_disk(disk):
     """Clean up ONLY the selected disk before partitioning to avoid 'busy' errors"""
     print(f"Cleaning up selected disk: {disk}")
     
     # No automatic detection - only work on the user-selected disk
+    partitions = get_partitions(disk)
+    devices = {disk, *partitions}
     
     # Step 1: Unmount any mounted partitions from this disk
     print("Unmounting any existing partitions...")
-    run_command("swapoff -a", capture_output=False)  # Turn off swap
-    run_command("umount -R /mnt", capture_output=False)  # Unmount recursively
+    run_command(["swapoff", "-a"], capture_output=False)  # Turn off swap
+    run_command(["umount", "-R", CHROOT_PATH], capture_output=False)  # Unmount recursively
     
     # Find and unmount any partitions from this disk
-    mount_check = run_command("mount | grep " + disk, capture_output=True)
-    if mount_check:
-        print(f"Found mounted partitions: {mount_check}")
+    mounted = [device for device, _, _ in get_mounts() if device in devices]
+    if mounted:
+        print(f"Found mounted partitions: {' '.join(mounted)}")
         # Unmount any partitions from this disk
-        run_command(f"umount -f {disk}*", capture_output=False)
+        run_command(["umount", "-f", *mounted], capture_output=False)
     
     # Step 2: Kill any processes using the disk
     print("Checking for processes using the disk...")
-    run_command(f"fuser -km {disk}", capture_output=False)
-    time.sleep(1)
+    run_command(["fuser", "-km", disk], capture_output=False)
+    settle_udev()
     
-    # Step 3: Clear filesystem signatures (only on partitions, not whole disk)
+    # Step 3: Clear filesystem signatures (only on partitions; sgdisk
+    # --zap-all clears the partition table itself)
     print("Clearing partition signatures...")
-    partitions = run_command(f"lsblk -ln -o NAME {disk} | grep -v '^{disk.split('/')[-1]}$'", capture_output=True)
     if partitions:
-        for partition in partitions.strip().split('\n'):
-            if partition.strip():
-                partition_path = f"/dev/{partition.strip()}"
-                run_command(f"wipefs -af {partition_path}", capture_output=False)
+        run_command(["wipefs", "-af", *partitions], capture_output=False)
+    
+    # Step 4: Discard the whole disk on SSDs, which drop every block at
+    # once with TRIM; devices without discard support just fail here and
+    # sgdisk --zap-all still follows
+    if is_rotational(disk) is False:
+        print("Discarding SSD blocks...")
+        run_command(["blkdiscard", "-f", disk], capture_output=False)
     
-    # Step 4: Force kernel to re-read partition table
+    # Signatures are gone, so cached probe results no longer hold
+    _blkid_table.cache_clear()
+    is_iso_device.cache_clear()
+    
+    # Step 5: Force kernel to re-read partition table
     print("Refreshing partition table...")
-    run_command(f"partprobe {disk}", capture_output=False)
-    run_command(f"blockdev --rereadpt {disk}", capture_output=False)
+    if not reread_partition_table(disk):
+        print(f"Warning: kernel did not re-read the partition table of {disk}")
     
-    # Step 5: Brief pause to let kernel settle
-    time.sleep(2)
+    # Step 6: Wait for udev to finish with the new partition devices
+    settle_udev()
     print("Disk cleanup completed")
     return True
 
 
-def create_uefi_partitions(disk):
-    """Create UEFI partition scheme"""
-    commands = [
-        f"sgdisk --zap-all {disk}",
-        f"sgdisk --new=1:0:+1G --typecode=1:ef00 --change-name=1:'EFI System' {disk}",
-        f"sgdisk --new=2:0:0 --typecode=2:8300 --change-name=2:'Linux filesystem' {disk}"
-    ]
+def create_partitions(disk, is_uefi):
+    """Create the UEFI or BIOS partition scheme
     
-    for i, cmd in enumerate(commands, 1):
-        print(f"Executing step {i}/{len(commands)}: {cmd}")
-        result = run_command(cmd, capture_output=True)
-        if result is None:
-            print(f"Error executing: {cmd}")
-            # Get detailed error
-            error_result = run_command(f"{cmd} 2>&1", capture_output=True)
-            print(f"Error details: {error_result}")
-            return False
-        print(f"Step {i} completed successfully")
-    return True
-
-
-def create_bios_partitions(disk):
-    """Create BIOS partition scheme"""
+    Both layouts put a boot partition first and the root filesystem after
+    it; only the boot partition's size, type and name differ.
+    """
+    if is_uefi:
+        boot_size, boot_type, boot_name = "+1G", "ef00", "EFI System"
+    else:
+        boot_size, boot_type, boot_name = "+1M", "ef02", "BIOS boot"
+    
+    # --zap-all exits once done, so the new table is written by a second call
     commands = [
-        f"sgdisk --zap-all {disk}",
-        f"sgdisk --new=1:0:+1M --typecode=1:ef02 --change-name=1:'BIOS boot' {disk}",
-        f"sgdisk --new=2:0:0 --typecode=2:8300 --change-name=2:'Linux filesystem' {disk}"
+        ["sgdisk", "--zap-all", disk],
+        ["sgdisk", "--clear",
+         f"--new=1:0:{boot_size}", f"--typecode=1:{boot_type}", f"--change-name=1:{boot_name}",
+         "--new=2:0:0", "--typecode=2:8300", "--change-name=2:Linux filesystem",
+         disk]
     ]
     
     for i, cmd in enumerate(commands, 1):
-        print(f"Executing step {i}/{len(commands)}: {cmd}")
+        print(f"Executing step {i}/{len(commands)}: {' '.join(cmd)}")
         result = run_command(cmd, capture_output=True)
         if result is None:
-            print(f"Error executing: {cmd}")
-            # Get detailed error
-            error_result = run_command(f"{cmd} 2>&1", capture_output=True)
-            print(f"Error details: {error_result}")
+            print(f"Error executing: {' '.join(cmd)} (details in the installer log)")
             return False
         print(f"Step {i} completed successfully")
     return True
 
 
+@functools.lru_cache(maxsize=32)
 def get_partition_name(disk, partition_number):
     """Get correct partition name for different disk types"""
     if 'nvme' in disk or 'mmcblk' in disk:
@@ -152,48 +276,76 @@ def get_partition_name(disk, partition_number):
         return f"{disk}{partition_number}"
 
 
+def get_partition_layout(disk):
+    """(boot, root) partition paths for the layout created above"""
+    return get_partition_name(disk, 1), get_partition_name(disk, 2)
+
+
 def format_partitions(disk, is_uefi):
-    """Format partitions according to system type"""
+    """Format partitions according to system type
+    
+    The EFI and root partitions are independent block devices, so their
+    mkfs commands run concurrently.
+    """
+    boot_partition, root_partition = get_partition_layout(disk)
+    
+    jobs = []
     if is_uefi:
-        boot_partition = get_partition_name(disk, 1)
-        root_partition = get_partition_name(disk, 2)
-        
-        print(f"Formatting EFI partition: {boot_partition}")
-        if not run_command(f"mkfs.fat -F32 {boot_partition}", capture_output=False):
-            print(f"Failed to format EFI partition: {boot_partition}")
+        jobs.append(("EFI", boot_partition, ["mkfs.fat", "-F32", boot_partition]))
+    
+    jobs.append(("root", root_partition, ["mkfs.ext4", "-F", root_partition]))
+    
+    processes = []
+    for label, partition, cmd in jobs:
+        print(f"Formatting {label} partition: {partition}")
+        try:
+            processes.append((label, partition, subprocess.Popen(cmd)))
+        except OSError as e:
+            print(f"Failed to start {cmd[0]}: {e}")
+            for _, _, process in processes:
+                process.kill()
             return False
-        print("EFI partition formatted successfully")
-    else:
-        root_partition = get_partition_name(disk, 2)
     
-    print(f"Formatting root partition: {root_partition}")
-    if not run_command(f"mkfs.ext4 -F {root_partition}", capture_output=False):
-        print(f"Failed to format root partition: {root_partition}")
-        return False
-    print("Root partition formatted successfully")
+    success = True
+    for label, partition, process in processes:
+        try:
+            returncode = process.wait(timeout=MKFS_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            print(f"Timed out formatting {label} partition: {partition}")
+            success = False
+            continue
+        
+        if returncode != 0:
+            print(f"Failed to format {label} partition: {partition}")
+            success = False
+        else:
+            print(f"{label} partition formatted successfully")
     
-    return True
+    return success
 
 
 def mount_partitions(disk, is_uefi):
     """Mount partitions to /mnt"""
-    root_partition = get_partition_name(disk, 2)
+    boot_partition, root_partition = get_partition_layout(disk)
     
     print(f"Mounting root partition: {root_partition}")
-    if not run_command(f"mount {root_partition} /mnt", capture_output=False):
+    if not run_command(["mount", root_partition, CHROOT_PATH], capture_output=False):
         print(f"Failed to mount root partition: {root_partition}")
         return False
     print("Root partition mounted successfully")
     
     if is_uefi:
-        boot_partition = get_partition_name(disk, 1)
         print("Creating EFI mount point...")
-        if not run_command("mkdir -p /mnt/boot", capture_output=False):
+        try:
+            os.makedirs(f"{CHROOT_PATH}/boot", exist_ok=True)
+        except OSError:
             print("Failed to create EFI directory")
             return False
         
         print(f"Mounting EFI partition: {boot_partition}")
-        if not run_command(f"mount {boot_partition} /mnt/boot", capture_output=False):
+        if not run_command(["mount", boot_partition, f"{CHROOT_PATH}/boot"], capture_output=False):
             print(f"Failed to mount EFI partition: {boot_partition}")
             return False
         print("EFI partition mounted successfully")
@@ -203,4 +355,13 @@ def mount_partitions(disk, is_uefi):
 
 def generate_fstab():
     """Generate fstab for mounted system"""
-    return run_command("genfstab -U /mnt >> /mnt/etc/fstab", capture_output=False)
+    fstab = run_command(["genfstab", "-U", CHROOT_PATH], capture_output=True)
+    if fstab is None:
+        return False
+    
+    try:
+        with open(f"{CHROOT_PATH}/etc/fstab", 'a') as f:
+            f.write(fstab + "\n")
+    except OSError:
+        return False
+    return True
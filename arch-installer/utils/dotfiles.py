@@ -3,8 +3,29 @@
 Dotfiles and development environment setup utilities
 """
 
-from .chroot import chroot_command
-from .system import run_command
+from concurrent.futures import ThreadPoolExecutor
+from .chroot import chroot_command, user_command
+from .config import GIT_CLONE_FLAGS
+
+# Shipped by the nvm package; sets NVM_DIR=~/.nvm and defines the nvm function
+NVM_INIT_SCRIPT = "/usr/share/nvm/init-nvm.sh"
+
+# Default files and directories that the dotfiles replace, relative to $HOME
+CONFLICTING_PATHS = (
+    ".config/alacritty",
+    ".config/ghostty",
+    ".config/hypr",
+    ".config/kitty",
+    ".config/nvim",
+    ".config/ohmyposh",
+    ".config/posting",
+    ".config/waybar",
+    ".config/wofi",
+    ".config/zed",
+    ".zshrc",
+    ".tmux.conf",
+    ".ssh",
+)
 
 
 def clone_dotfiles(username):
@@ -12,7 +33,7 @@ def clone_dotfiles(username):
     print("Cloning dotfiles...")
     
     # Clonar dotfiles como usuario
-    clone_cmd = f"sudo -u {username} git clone https://github.com/armando-rios/dotfiles.git /home/{username}/.dotfiles"
+    clone_cmd = user_command(username, ["git", "clone", *GIT_CLONE_FLAGS, "https://github.com/armando-rios/dotfiles.git", f"/home/{username}/.dotfiles"])
     if not chroot_command(clone_cmd):
         print("Failed to clone dotfiles repository")
         return False
@@ -25,33 +46,16 @@ def setup_symbolic_links(username):
     """Create symbolic links for dotfiles using stow (exactamente como en setup.sh)"""
     print("Creating symbolic links for dotfiles...")
     
-    # Cambiar al directorio de dotfiles
-    cd_cmd = f"sudo -u {username} bash -c 'cd /home/{username}/.dotfiles'"
-    
     # Eliminar archivos y directorios que van a ser reemplazados por dotfiles
     print("Removing conflicting default config files and directories...")
-    remove_cmd = f"""sudo -u {username} bash -c '
-        rm -rf /home/{username}/.config/alacritty 
-        rm -rf /home/{username}/.config/ghostty 
-        rm -rf /home/{username}/.config/hypr 
-        rm -rf /home/{username}/.config/kitty 
-        rm -rf /home/{username}/.config/nvim 
-        rm -rf /home/{username}/.config/ohmyposh 
-        rm -rf /home/{username}/.config/posting 
-        rm -rf /home/{username}/.config/waybar 
-        rm -rf /home/{username}/.config/wofi 
-        rm -rf /home/{username}/.config/zed
-        rm -f /home/{username}/.zshrc 
-        rm -f /home/{username}/.tmux.conf
-        rm -rf /home/{username}/.ssh
-    '"""
+    remove_cmd = user_command(username, ["rm", "-rf", *(f"/home/{username}/{path}" for path in CONFLICTING_PATHS)])
     
     if not chroot_command(remove_cmd):
         print("Warning: Failed to remove some conflicting files")
     
     # Crear enlaces simbólicos con stow
     print("Creating symbolic links with stow...")
-    stow_cmd = f"sudo -u {username} bash -c 'cd /home/{username}/.dotfiles && stow .'"
+    stow_cmd = user_command(username, ["env", "-C", f"/home/{username}/.dotfiles", "stow", "."])
     if not chroot_command(stow_cmd):
         print("Failed to create symbolic links with stow")
         return False
@@ -64,9 +68,9 @@ def install_nodejs_with_nvm(username):
     """Install Node.js with nvm (exactamente como en setup.sh)"""
     print("Installing Node.js with nvm...")
     
-    # Usar zsh con dotfiles ya aplicados que incluyen nvm
-    # Esto requiere que los dotfiles ya estén aplicados con la configuración de nvm
-    nodejs_cmd = f"""sudo -u {username} zsh -c 'source /home/{username}/.zshrc && nvm install --lts && nvm use --lts'"""
+    # nvm is a shell function; load only its init script rather than the
+    # whole .zshrc with oh-my-zsh, prompt and plugins
+    nodejs_cmd = user_command(username, ["bash", "-c", f". {NVM_INIT_SCRIPT} && nvm install --lts && nvm use --lts"])
     
     if not chroot_command(nodejs_cmd):
         print("Failed to install Node.js with nvm")
@@ -81,7 +85,8 @@ def install_bun(username):
     print("Installing Bun.js...")
     
     # Instalar bun
-    bun_cmd = f"sudo -u {username} bash -c 'curl -fsSL https://bun.sh/install | bash'"
+    # The pipeline runs in the chroot, so it stays in a shell there
+    bun_cmd = user_command(username, ["bash", "-c", "curl -fsSL https://bun.sh/install | bash"])
     if not chroot_command(bun_cmd):
         print("Failed to install Bun.js")
         return False
@@ -90,13 +95,22 @@ def install_bun(username):
     return True
 
 
-def phase4_dotfiles_and_development(username):
-    """Complete Phase 4: Dotfiles and development environment setup"""
+def phase4_dotfiles_and_development(username, skip_clone=False):
+    """Complete Phase 4: Dotfiles and development environment setup
+    
+    skip_clone is set when the dotfiles were already cloned during Phase 3.
+    """
     print("=== Phase 4: Dotfiles and Development Environment ===")
     
     steps = [
-        ("Cloning dotfiles repository", lambda: clone_dotfiles(username)),
-        ("Setting up symbolic links with stow", lambda: setup_symbolic_links(username)),
+        ("Setting up symbolic links with stow", lambda: setup_symbolic_links(username))
+    ]
+    if not skip_clone:
+        steps.insert(0, ("Cloning dotfiles repository", lambda: clone_dotfiles(username)))
+    
+    # Runtime installers only need the linked dotfiles and are independent
+    # downloads, so they run concurrently once the steps above are done
+    parallel_steps = [
         ("Installing Node.js with nvm", lambda: install_nodejs_with_nvm(username)),
         ("Installing Bun.js", lambda: install_bun(username))
     ]
@@ -108,5 +122,16 @@ def phase4_dotfiles_and_development(username):
             return False
         print(f"✓ {step_name} completed successfully")
     
+    print(f"\n--- {' / '.join(step_name for step_name, _ in parallel_steps)} ---")
+    with ThreadPoolExecutor(max_workers=len(parallel_steps)) as executor:
+        futures = [(step_name, executor.submit(step_func)) for step_name, step_func in parallel_steps]
+        results = [(step_name, future.result()) for step_name, future in futures]
+    
+    for step_name, ok in results:
+        if not ok:
+            print(f"ERROR: Failed at step: {step_name}")
+            return False
+        print(f"✓ {step_name} completed successfully")
+    
     print("\n=== Phase 4 completed successfully! ===")
     return True
\ No newline at end of file
@@ -3,9 +3,28 @@
 Package definitions for Arch Linux installer
 """
 
+# Base system installed by pacstrap, including everything Phase 2 needs
+BASE_PACKAGES = (
+    'base',
+    'base-devel',
+    'linux',
+    'linux-firmware',
+    'networkmanager',
+    'grub',
+    'dialog',
+    'vim',
+    'sudo',
+    'git',
+)
+
+# Extra base packages only needed on UEFI systems
+UEFI_BASE_PACKAGES = (
+    'efibootmgr',
+)
+
 # Essential packages organized by category
 ESSENTIAL_PACKAGES = {
-    'development': [
+    'development': (
         'git',
         'gcc',
         'neovim',
@@ -19,18 +38,18 @@ ESSENTIAL_PACKAGES = {
         'htop',
         'btop',
         'tmux',
-    ],
+    ),
     
-    'shell_terminal': [
+    'shell_terminal': (
         'zsh',
         'nvm',
         'lsd',
         'kitty',
         'ghostty',
         'zoxide',
-    ],
+    ),
     
-    'wayland_hyprland': [
+    'wayland_hyprland': (
         'hyprland',
         'waybar',
         'hyprpaper',
@@ -40,17 +59,17 @@ ESSENTIAL_PACKAGES = {
         'xdg-desktop-portal-hyprland',
         'xdg-utils',
         'dunst',
-    ],
+    ),
     
-    'system_services': [
+    'system_services': (
         'sddm',
         'network-manager-applet',
         'iwd',
         'wireless_tools',
         'seatd',
-    ],
+    ),
     
-    'audio': [
+    'audio': (
         'pipewire',
         'pipewire-alsa',
         'pipewire-pulse', 
@@ -58,27 +77,28 @@ ESSENTIAL_PACKAGES = {
         'wireplumber',
         'pavucontrol',
         'helvum',
-    ],
+    ),
     
-    'applications': [
+    'applications': (
         'discord',
         'zed',
         'nwg-look',
         'nautilus',
-    ],
+    ),
     
-    'fonts': [
-        'ttf-jetbrains-mono-nerd'
-    ]
+    'fonts': (
+        'ttf-jetbrains-mono-nerd',
+    )
 }
 
-# Flatten all essential packages into a single list
-ALL_ESSENTIAL_PACKAGES = []
-for category_packages in ESSENTIAL_PACKAGES.values():
-    ALL_ESSENTIAL_PACKAGES.extend(category_packages)
+# Flatten all essential packages into a single tuple, dropping packages
+# listed in more than one category
+ALL_ESSENTIAL_PACKAGES = tuple(dict.fromkeys(
+    package for category_packages in ESSENTIAL_PACKAGES.values() for package in category_packages
+))
 
 # AMD graphics drivers
-AMD_GRAPHICS_PACKAGES = [
+AMD_GRAPHICS_PACKAGES = (
     'libva-mesa-driver',
     'mesa',
     'vulkan-radeon',
@@ -86,28 +106,40 @@ AMD_GRAPHICS_PACKAGES = [
     'xf86-video-ati',
     'xorg-server',
     'xorg-xinit'
-]
+)
 
 # AUR packages
-AUR_PACKAGES = [
+AUR_PACKAGES = (
     'catppuccin-gtk-theme-mocha',
     'zen-browser-bin',
     'wshowkeys-mao-git', 
     'hyprshot'
-]
+)
+
+def get_base_packages(is_uefi):
+    """Get packages for the pacstrap base system"""
+    if is_uefi:
+        return BASE_PACKAGES + UEFI_BASE_PACKAGES
+    return BASE_PACKAGES
 
 def get_packages_by_category(category):
     """Get packages for a specific category"""
-    return ESSENTIAL_PACKAGES.get(category, [])
+    return ESSENTIAL_PACKAGES.get(category, ())
 
 def get_all_essential_packages():
-    """Get all essential packages as a flat list"""
-    return ALL_ESSENTIAL_PACKAGES.copy()
+    """Get all essential packages as a flat tuple"""
+    return ALL_ESSENTIAL_PACKAGES
+
+def get_official_packages(include_amd=True):
+    """Get every repo package for Phase 3, for a single pacman transaction"""
+    if include_amd:
+        return ALL_ESSENTIAL_PACKAGES + AMD_GRAPHICS_PACKAGES
+    return ALL_ESSENTIAL_PACKAGES
 
 def get_amd_graphics_packages():
     """Get AMD graphics driver packages"""
-    return AMD_GRAPHICS_PACKAGES.copy()
+    return AMD_GRAPHICS_PACKAGES
 
 def get_aur_packages():
     """Get AUR packages"""
-    return AUR_PACKAGES.copy()
+    return AUR_PACKAGES
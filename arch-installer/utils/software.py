@@ -3,39 +3,126 @@
 Software installation and configuration utilities for Arch Linux
 """
 
-from .chroot import chroot_command, enable_nopasswd_for_installation, disable_nopasswd_after_installation
-from .system import run_command
-from .config import PACMAN_FLAGS, YAY_FLAGS, MAKEPKG_FLAGS, YAY_REPO, OH_MY_ZSH_REPO, HOME_PATH_TEMPLATE, SYSTEM_SERVICES
-from .packages import get_all_essential_packages, get_amd_graphics_packages, get_aur_packages
+import functools
+import os
+import shlex
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from .chroot import ChrootBatch, chroot_command, chroot_which, user_command, enable_nopasswd_for_installation, disable_nopasswd_after_installation
+from .config import CHROOT_PATH, PACMAN_DB_PATH, PACMAN_LOCAL_DB_PATH, PACMAN_CACHE_PATH, PACMAN_FLAGS, PREFETCH_STOP_TIMEOUT, YAY_FLAGS, MAKEPKG_FLAGS, GIT_CLONE_FLAGS, YAY_REPO, OH_MY_ZSH_REPO, SYSTEM_SERVICES
+from .packages import get_official_packages, get_aur_packages
+
+
+@functools.lru_cache(maxsize=1)
+def get_installed_packages():
+    """Names of packages installed in the chroot (cached, call cache_clear() after installing)
+    
+    Read from the entries in pacman's local database on the mounted root,
+    which are named <name>-<version>-<release>, so no process is started.
+    """
+    try:
+        entries = os.listdir(CHROOT_PATH + PACMAN_LOCAL_DB_PATH)
+    except OSError:
+        return frozenset()
+    return frozenset(entry.rsplit('-', 2)[0] for entry in entries if entry.count('-') >= 2)
 
 
 def install_packages(packages, use_aur=False, username=None):
-    """Install packages using pacman or yay"""
+    """Install packages using pacman or yay, skipping those already installed"""
     if isinstance(packages, str):
         packages = [packages]
     
-    packages_str = ' '.join(packages)
+    installed = get_installed_packages()
+    packages = [package for package in packages if package not in installed]
+    if not packages:
+        print("All packages already installed")
+        return True
+    
+    # Installing changes the local database, so read it again next time
+    get_installed_packages.cache_clear()
     
     if use_aur:
         # Use yay for AUR packages
-        cmd = f"sudo -u {username} yay {YAY_FLAGS} {packages_str}"
+        cmd = user_command(username, ["yay", *YAY_FLAGS, *packages])
         return chroot_command(cmd)
     else:
-        # Use pacman for official packages
-        cmd = f"pacman -S {PACMAN_FLAGS} {packages_str}"
-        return chroot_command(cmd)
+        # Use pacman for official packages, all in one transaction
+        cmd = ["pacman", "-S", *PACMAN_FLAGS, *packages]
+        if chroot_command(cmd):
+            return True
+        
+        if len(packages) == 1:
+            return False
+        
+        # One bad package fails the whole transaction; retry individually
+        # so everything else still gets installed and the culprit is named
+        print("Batch install failed, retrying packages individually...")
+        failed = [package for package in packages
+                  if not chroot_command(["pacman", "-S", *PACMAN_FLAGS, package])]
+        if failed:
+            print(f"Failed to install: {' '.join(failed)}")
+            return False
+        return True
 
 
-def install_essential_packages():
-    """Install essential packages organized by category"""
-    print("Installing essential packages...")
-    return install_packages(get_all_essential_packages())
+def start_package_download():
+    """Start downloading the Phase 3 repo packages in the background
+    
+    pacman -Sw only fills the chroot's package cache, so it can overlap
+    with Phase 2; the later pacman -S then finds the files already there.
+    It runs from the host against the chroot's database and cache instead
+    of through arch-chroot, whose mounts would race with Phase 2's.
+    Returns the Popen handle, which must be stopped with
+    stop_package_download before any other pacman runs, or None if there
+    is nothing to fetch or it failed to start.
+    """
+    installed = get_installed_packages()
+    packages = [package for package in get_official_packages() if package not in installed]
+    if not packages:
+        return None
+    
+    try:
+        return subprocess.Popen(
+            ["pacman", "-Sw",
+             "--root", CHROOT_PATH,
+             "--dbpath", CHROOT_PATH + PACMAN_DB_PATH,
+             "--cachedir", CHROOT_PATH + PACMAN_CACHE_PATH,
+             *PACMAN_FLAGS, *packages],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+    except OSError:
+        return None
 
 
-def install_amd_graphics_drivers():
-    """Install AMD graphics drivers"""
-    print("Installing AMD graphics drivers...")
-    return install_packages(get_amd_graphics_packages())
+def stop_package_download(process, timeout):
+    """Wait up to timeout seconds for the download, then stop it
+    
+    pacman releases its database lock when terminated; kill is only the
+    fallback if it does not exit within PREFETCH_STOP_TIMEOUT.
+    """
+    try:
+        process.wait(timeout=timeout)
+        return
+    except subprocess.TimeoutExpired:
+        process.terminate()
+    
+    try:
+        process.wait(timeout=PREFETCH_STOP_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def install_essential_packages():
+    """Install essential packages and AMD graphics drivers
+    
+    Everything goes into one pacman transaction, so dependencies are
+    resolved, downloaded and hooks run only once.
+    """
+    print("Installing essential packages and AMD graphics drivers...")
+    return install_packages(get_official_packages())
 
 
 def setup_aur_helper(username):
@@ -47,24 +134,26 @@ def setup_aur_helper(username):
         print("Failed to install git and base-devel")
         return False
     
+    yay_dir = f"/home/{username}/yay"
+    
     # Limpiar instalación previa si existe
-    chroot_command(f"rm -rf /home/{username}/yay")
+    chroot_command(["rm", "-rf", yay_dir])
     
     # Clone and compile yay
     print("Cloning yay repository...")
-    if not chroot_command(f"sudo -u {username} git clone https://aur.archlinux.org/yay.git /home/{username}/yay"):
+    if not chroot_command(user_command(username, ["git", "clone", *GIT_CLONE_FLAGS, YAY_REPO, yay_dir])):
         print("Failed to clone yay repository")
         return False
     
-    # Build and install yay
+    # Build and install yay; env -C sets the working directory without a shell
     print("Building and installing yay...")
-    build_cmd = f'sudo -u {username} bash -c "cd /home/{username}/yay && makepkg -si --noconfirm"'
+    build_cmd = user_command(username, ["env", "-C", yay_dir, "makepkg", *MAKEPKG_FLAGS])
     if not chroot_command(build_cmd):
         print("Failed to build yay")
         return False
     
     # Limpiar directorio temporal
-    chroot_command(f"rm -rf /home/{username}/yay")
+    chroot_command(["rm", "-rf", yay_dir])
     
     print("yay AUR helper installed successfully")
     return True
@@ -81,7 +170,7 @@ def install_ohmyzsh(username):
     print("Installing oh-my-zsh...")
     
     # Clone oh-my-zsh repository
-    omz_cmd = f"sudo -u {username} git clone https://github.com/ohmyzsh/ohmyzsh /home/{username}/.oh-my-zsh"
+    omz_cmd = user_command(username, ["git", "clone", *GIT_CLONE_FLAGS, OH_MY_ZSH_REPO, f"/home/{username}/.oh-my-zsh"])
     if not chroot_command(omz_cmd):
         print("Failed to install oh-my-zsh")
         return False
@@ -90,29 +179,38 @@ def install_ohmyzsh(username):
     return True
 
 
-def change_shell_to_zsh(username):
-    """Change default shell to zsh"""
-    print("Changing default shell to zsh...")
+def change_shell_commands(username, zsh_path):
+    """Commands to change the user's login shell"""
+    return [
+        shlex.join(["chsh", "-s", zsh_path, username])
+    ]
+
+
+def enable_services_commands(services=SYSTEM_SERVICES):
+    """Commands to enable system services, all in one systemctl call"""
+    return [
+        shlex.join(["systemctl", "enable", *services])
+    ]
+
+
+def configure_shell_and_services(username):
+    """Change default shell to zsh and enable services in one chroot shell"""
+    print("Changing default shell to zsh and enabling system services...")
     
-    if not chroot_command(f"chsh -s $(which zsh) {username}"):
-        print(f"Failed to change shell for {username}")
+    zsh_path = chroot_which("zsh")
+    if not zsh_path:
+        print("zsh is not installed in the new system")
         return False
     
-    print("Shell changed to zsh")
-    return True
-
-
-def enable_services():
-    """Enable necessary system services"""
-    print("Enabling system services...")
+    with ChrootBatch() as batch:
+        batch.step(change_shell_commands(username, zsh_path))
+        batch.step(enable_services_commands())
     
-    for service in SYSTEM_SERVICES:
-        print(f"Enabling {service}...")
-        if not chroot_command(f"systemctl enable {service}"):
-            print(f"Failed to enable {service}")
-            return False
+    if not batch.success:
+        print("Failed to change shell or enable system services")
+        return False
     
-    print("All services enabled successfully")
+    print("Shell changed to zsh and services enabled")
     return True
 
 
@@ -126,22 +224,26 @@ def phase3_install_essential_software(username):
         return False
     
     try:
-        steps = [
-            ("Installing essential packages", install_essential_packages),
-            ("Installing AMD graphics drivers", install_amd_graphics_drivers),
-            ("Setting up AUR helper (yay)", lambda: setup_aur_helper(username)),
-            ("Installing AUR packages", lambda: install_aur_packages(username)),
-            ("Installing oh-my-zsh", lambda: install_ohmyzsh(username)),
-            ("Changing shell to zsh", lambda: change_shell_to_zsh(username)),
-            ("Enabling system services", enable_services)
-        ]
-        
-        for step_name, step_func in steps:
-            print(f"\n--- {step_name} ---")
-            if not step_func():
-                print(f"ERROR: Failed at step: {step_name}")
-                return False
-            print(f"✓ {step_name} completed successfully")
+        # The oh-my-zsh clone needs nothing from the earlier steps, so it
+        # downloads in the background while packages and yay are installed;
+        # leaving the with-block always waits for it
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            ohmyzsh_future = executor.submit(install_ohmyzsh, username)
+            
+            steps = [
+                ("Installing essential packages and graphics drivers", install_essential_packages),
+                ("Setting up AUR helper (yay)", lambda: setup_aur_helper(username)),
+                ("Installing AUR packages", lambda: install_aur_packages(username)),
+                ("Installing oh-my-zsh", ohmyzsh_future.result),
+                ("Changing shell and enabling services", lambda: configure_shell_and_services(username))
+            ]
+            
+            for step_name, step_func in steps:
+                print(f"\n--- {step_name} ---")
+                if not step_func():
+                    print(f"ERROR: Failed at step: {step_name}")
+                    return False
+                print(f"✓ {step_name} completed successfully")
         
         print("\n=== Phase 3 completed successfully! ===")
         return True
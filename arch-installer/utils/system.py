@@ -3,23 +3,79 @@
 System validation and detection utilities
 """
 
+import asyncio
+import functools
+import json
+import logging
 import os
+import re
+import shlex
+import shutil
+import socket
 import subprocess
-import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from .config import CONNECTIVITY_HOST, CONNECTIVITY_ENDPOINTS, CONNECTIVITY_TIMEOUT, PACMAN_CONF_PATH, MIRRORLIST_PATH, PARALLEL_DOWNLOADS, REFLECTOR_ARGS, REFLECTOR_TIMEOUT
 
+# Virtual block devices that are never valid install targets
+IGNORED_DISK_PREFIXES = ('/dev/loop', '/dev/ram', '/dev/zram', '/dev/sr')
 
+log = logging.getLogger(__name__)
+
+
+def _can_connect(address):
+    """Try a single TCP connection to (host, port)"""
+    try:
+        with socket.create_connection(address, timeout=CONNECTIVITY_TIMEOUT):
+            return True
+    except OSError:
+        return False
+
+
+@functools.lru_cache(maxsize=None)
 def check_internet_connection():
-    """Check if internet connection is available"""
+    """Check if internet connection is available (cached, call cache_clear() to re-check)
+    
+    Only a connection to CONNECTIVITY_HOST counts, since pacstrap needs DNS
+    as well. The raw addresses are probed alongside it; once all of them have
+    failed the host gets one more CONNECTIVITY_TIMEOUT instead of the whole
+    DNS lookup timeout.
+    """
+    executor = ThreadPoolExecutor(max_workers=1 + len(CONNECTIVITY_ENDPOINTS))
     try:
-        urllib.request.urlopen('http://archlinux.org', timeout=5)
-        return True
-    except:
+        host_future = executor.submit(_can_connect, CONNECTIVITY_HOST)
+        address_futures = [executor.submit(_can_connect, address) for address in CONNECTIVITY_ENDPOINTS]
+        
+        for future in as_completed([host_future, *address_futures]):
+            if future is host_future:
+                return future.result()
+            if all(other.done() and not other.result() for other in address_futures):
+                done, _ = wait([host_future], timeout=CONNECTIVITY_TIMEOUT)
+                return bool(done) and host_future.result()
         return False
+    finally:
+        executor.shutdown(wait=False)
 
 
+@functools.lru_cache(maxsize=None)
 def is_uefi():
     """Check if system is UEFI or BIOS"""
-    return os.path.exists('/sys/firmware/efi')
+    return os.path.isdir('/sys/firmware/efi')
+
+
+def get_mounts():
+    """Read mounted filesystems from /proc/mounts as (device, mountpoint, fstype)"""
+    mounts = []
+    try:
+        with open('/proc/mounts') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 3:
+                    # /proc/mounts escapes spaces and tabs as octal sequences
+                    mountpoint = fields[1].replace('\\040', ' ').replace('\\011', '\t')
+                    mounts.append((fields[0], mountpoint, fields[2]))
+    except OSError:
+        pass
+    return mounts
 
 
 def sync_clock():
@@ -31,35 +87,147 @@ def sync_clock():
         return False
 
 
-def run_command(command, capture_output=True):
-    """Run shell command and return result"""
+def set_parallel_downloads(conf_path=PACMAN_CONF_PATH, count=PARALLEL_DOWNLOADS):
+    """Enable ParallelDownloads in a pacman.conf, editing the file in place"""
+    try:
+        with open(conf_path) as f:
+            content = f.read()
+    except OSError:
+        return False
+    
+    setting = f"ParallelDownloads = {count}"
+    content, replaced = re.subn(r'^#?\s*ParallelDownloads\s*=.*$', setting, content, flags=re.MULTILINE)
+    if not replaced:
+        content = re.sub(r'^\[options\]$', f"[options]\n{setting}", content, count=1, flags=re.MULTILINE)
+    
+    try:
+        with open(conf_path, 'w') as f:
+            f.write(content)
+    except OSError:
+        return False
+    return True
+
+
+@functools.lru_cache(maxsize=1)
+def rank_mirrors():
+    """Rank mirrors by download rate with reflector (runs once per session)"""
+    if not shutil.which('reflector'):
+        return False
+    
+    try:
+        subprocess.run(
+            ['reflector', *REFLECTOR_ARGS, '--save', MIRRORLIST_PATH],
+            capture_output=True,
+            check=True,
+            timeout=REFLECTOR_TIMEOUT
+        )
+        return True
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        return False
+
+
+def run_command(args, capture_output=True):
+    """Run command from an argument list (no shell) and return result"""
     try:
         result = subprocess.run(
-            command, 
-            shell=True, 
+            args, 
             capture_output=capture_output, 
             text=True, 
             check=True
         )
         return result.stdout.strip() if capture_output else True
     except subprocess.CalledProcessError as e:
+        # stderr was captured on the first run, so a failure never needs re-running
+        log.warning("%s exited with %d: %s", shlex.join(args), e.returncode, (e.stderr or "").strip())
+        return None
+    except OSError as e:
+        # Executable missing or not runnable
+        log.warning("%s could not be started: %s", shlex.join(args), e)
+        return None
+
+
+async def run_command_async(args, on_line=None):
+    """Run command from an argument list, streaming each output line to on_line"""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT
+        )
+    except OSError:
         return None
+    
+    try:
+        async for raw_line in process.stdout:
+            if on_line:
+                on_line(raw_line.decode(errors='replace').rstrip())
+        returncode = await process.wait()
+    except asyncio.CancelledError:
+        # Ctrl-C cancels the task; don't leave the child running
+        if process.returncode is None:
+            process.terminate()
+            await process.wait()
+        raise
+    
+    return True if returncode == 0 else None
 
 
+def format_size(size_bytes):
+    """Format a byte count the way lsblk does (1024-based, e.g. 476.9G)"""
+    size = float(size_bytes)
+    for unit in ("B", "K", "M", "G", "T"):
+        if size < 1024:
+            break
+        size /= 1024
+    else:
+        unit = "P"
+    
+    if unit == "B" or size == int(size):
+        return f"{size:.0f}{unit}"
+    return f"{size:.1f}{unit}"
+
+
+@functools.lru_cache(maxsize=1)
 def get_available_disks():
-    """Get list of available disks"""
-    output = run_command("lsblk -dpno NAME,SIZE,MODEL | grep -v loop")
-    if not output:
+    """Get list of available disks (cached, call cache_clear() to re-probe)"""
+    try:
+        output = subprocess.run(
+            ['lsblk', '--json', '--bytes', '--nodeps', '--paths',
+             '--output', 'NAME,SIZE,MODEL,TYPE,RM,RO'],
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+        devices = json.loads(output).get('blockdevices', [])
+    except (subprocess.CalledProcessError, ValueError):
         return []
     
     disks = []
-    for line in output.split('\n'):
-        if line.strip():
-            parts = line.split()
-            if len(parts) >= 2:
-                name = parts[0]
-                size = parts[1]
-                model = ' '.join(parts[2:]) if len(parts) > 2 else 'Unknown'
-                disks.append({'name': name, 'size': size, 'model': model})
+    for device in devices:
+        name = device.get('name') or ''
+        if device.get('type') != 'disk' or name.startswith(IGNORED_DISK_PREFIXES):
+            continue
+        
+        model = (device.get('model') or '').strip() or 'Unknown'
+        disks.append({'name': name, 'size': format_size(device.get('size') or 0), 'model': model})
+    
+    return disks
+
+
+def get_partitions(disk):
+    """Get partition paths of a disk from a single lsblk JSON call"""
+    try:
+        output = subprocess.run(
+            ['lsblk', '--json', '--paths', '--output', 'NAME,TYPE', disk],
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+        devices = json.loads(output).get('blockdevices', [])
+    except (subprocess.CalledProcessError, ValueError):
+        return []
     
-    return disks
\ No newline at end of file
+    return [child['name']
+            for device in devices
+            for child in device.get('children') or []
+            if child.get('type') == 'part']
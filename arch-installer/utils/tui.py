@@ -5,8 +5,53 @@ Terminal User Interface using curses for archinstall-like experience
 
 import curses
 import curses.textpad
-import time
 import textwrap
+from collections import deque
+
+# Line prefixes show_info_screen strips and renders in a status color pair
+STATUS_COLOR_PAIRS = {
+    "SUCCESS": 3,
+    "ERROR": 4,
+    "WARNING": 5,
+    "INFO": 6,
+}
+
+# Progress step status -> (glyph, color pair); pair 0 is the default colors
+STEP_STATUS_STYLES = {
+    "completed": ("✓", 3),
+    "current": ("▶", 6),
+    "error": ("✗", 4),
+}
+
+
+class ProgressPanel:
+    """Handle to an on-screen progress list that redraws only changed rows
+    
+    The steps list given to TUI.begin_progress is updated in place.
+    """
+    
+    def __init__(self, tui, steps, start_y):
+        self.tui = tui
+        self.steps = steps
+        self.start_y = start_y
+    
+    def update(self, index, step_desc, status):
+        """Set one step's text and status, skipping the redraw if unchanged"""
+        if self.steps[index] == (step_desc, status):
+            return
+        
+        self.steps[index] = (step_desc, status)
+        self.tui.draw_step_row(self.start_y + index, step_desc, status)
+        self.tui.stdscr.refresh()
+    
+    def repaint(self):
+        """Repaint the whole screen on the next refresh
+        
+        Row updates only send changed cells, so call this after a step
+        whose child processes or print() wrote to the terminal.
+        """
+        self.tui.stdscr.clearok(True)
+        self.tui.stdscr.refresh()
 
 
 class TUI:
@@ -14,6 +59,9 @@ class TUI:
         self.stdscr = None
         self.height = 0
         self.width = 0
+        self.progress_start_y = 4
+        self.log_lines = deque(maxlen=50)
+        self.log_start_y = None
         
     def init_screen(self):
         """Initialize curses screen"""
@@ -49,6 +97,11 @@ class TUI:
         except curses.error:
             pass
         
+    def handle_resize(self):
+        """Pick up new terminal dimensions after a KEY_RESIZE event"""
+        curses.update_lines_cols()
+        self.height, self.width = self.stdscr.getmaxyx()
+        
     def cleanup(self):
         """Cleanup curses"""
         if self.stdscr:
@@ -59,6 +112,8 @@ class TUI:
     
     def draw_header(self, title, step=None, total_steps=None):
         """Draw header bar"""
+        # clear() forces a full repaint, wiping anything child processes or
+        # print() wrote to the terminal behind curses
         self.stdscr.clear()
         
         # Header background
@@ -76,13 +131,26 @@ class TUI:
         footer_y = self.height - 1
         self.safe_addstr(footer_y, 2, instructions)
         
+    def draw_menu_option(self, y, option, is_selected):
+        """Draw a single menu row, highlighted when selected"""
+        if is_selected:
+            self.safe_addstr(y, 2, f"> {option}", curses.color_pair(2) | curses.A_BOLD)
+        else:
+            self.safe_addstr(y, 2, f"  {option}")
+    
     def show_menu(self, title, options, selected=0, step=None, total_steps=None):
-        """Show interactive menu with keyboard navigation"""
+        """Show interactive menu with keyboard navigation
+        
+        Moving the selection within the visible window only redraws the
+        old and new rows; the whole screen is drawn again only when the
+        window scrolls or the terminal is resized.
+        """
+        start_y = 3
+        needs_redraw = True
+        drawn_selected = selected
+        drawn_start_idx = None
+        
         while True:
-            self.draw_header(title, step, total_steps)
-            
-            # Menu content area
-            start_y = 3
             max_visible = self.height - 6  # Reserve space for header and footer
             
             # Calculate visible range
@@ -98,24 +166,29 @@ class TUI:
                 start_idx = 0
                 end_idx = len(options)
             
-            # Draw options
-            for i, option in enumerate(options[start_idx:end_idx], start_idx):
-                y = start_y + i - start_idx
+            if needs_redraw or start_idx != drawn_start_idx:
+                self.draw_header(title, step, total_steps)
                 
-                if i == selected:
-                    # Highlight selected option
-                    self.safe_addstr(y, 2, f"> {option}", curses.color_pair(2) | curses.A_BOLD)
-                else:
-                    self.safe_addstr(y, 2, f"  {option}")
-            
-            # Show scrolling indicator if needed
-            if len(options) > max_visible:
-                if start_idx > 0:
-                    self.safe_addstr(start_y - 1, self.width - 3, "↑")
-                if end_idx < len(options):
-                    self.safe_addstr(start_y + max_visible, self.width - 3, "↓")
+                # Draw options
+                for i, option in enumerate(options[start_idx:end_idx], start_idx):
+                    self.draw_menu_option(start_y + i - start_idx, option, i == selected)
+                
+                # Show scrolling indicator if needed
+                if len(options) > max_visible:
+                    if start_idx > 0:
+                        self.safe_addstr(start_y - 1, self.width - 3, "↑")
+                    if end_idx < len(options):
+                        self.safe_addstr(start_y + max_visible, self.width - 3, "↓")
+                
+                self.draw_footer()
+                needs_redraw = False
+            elif selected != drawn_selected:
+                # Same window: only the previous and new selection change
+                self.draw_menu_option(start_y + drawn_selected - start_idx, options[drawn_selected], False)
+                self.draw_menu_option(start_y + selected - start_idx, options[selected], True)
             
-            self.draw_footer()
+            drawn_selected = selected
+            drawn_start_idx = start_idx
             self.stdscr.refresh()
             
             # Handle input
@@ -128,6 +201,9 @@ class TUI:
                 selected += 1
             elif key == ord('\n') or key == ord(' '):
                 return selected
+            elif key == curses.KEY_RESIZE:
+                self.handle_resize()
+                needs_redraw = True
             elif key == ord('q') or key == 27:  # ESC
                 return -1
     
@@ -169,45 +245,68 @@ class TUI:
                 return result
     
     def show_password_input(self, title, prompt, step=None, total_steps=None):
-        """Show password input dialog with hidden characters"""
-        import getpass
-        
-        self.draw_header(title, step, total_steps)
+        """Show password input dialog with hidden characters
         
-        # Draw prompt
-        start_y = 4
-        self.safe_addstr(start_y, 2, prompt)
-        self.safe_addstr(start_y + 2, 2, "Password will be hidden as you type")
-        self.safe_addstr(start_y + 4, 2, "> ")
-        
-        self.draw_footer("Type password, Enter to finish")
-        self.stdscr.refresh()
-        
-        # Temporarily exit curses to use getpass
-        curses.endwin()
+        Keys are read inside curses and echoed as '*', so the screen is
+        never torn down and re-initialized.
+        """
+        chars = []
+        input_y = 8
+        curses.curs_set(1)  # Show cursor
         
         try:
-            password = getpass.getpass("")
-            return password
+            while True:
+                self.draw_header(title, step, total_steps)
+                
+                # Draw prompt
+                start_y = 4
+                self.safe_addstr(start_y, 2, prompt)
+                self.safe_addstr(start_y + 2, 2, "Password will be hidden as you type")
+                self.safe_addstr(input_y, 2, "> " + "*" * len(chars))
+                
+                self.draw_footer("Type password, Enter to finish")
+                # Leave the visible cursor after the mask, not in the footer
+                self.stdscr.move(input_y, min(4 + len(chars), self.width - 1))
+                self.stdscr.refresh()
+                
+                # Only the mask row changes while typing
+                while True:
+                    key = self.stdscr.get_wch()
+                    
+                    if key in ("\n", "\r", curses.KEY_ENTER):
+                        return "".join(chars)
+                    elif key in ("\x7f", "\b", curses.KEY_BACKSPACE):
+                        if chars:
+                            chars.pop()
+                    elif key == curses.KEY_RESIZE:
+                        self.handle_resize()
+                        break
+                    elif isinstance(key, str) and key.isprintable():
+                        chars.append(key)
+                    else:
+                        continue
+                    
+                    self.stdscr.move(input_y, 0)
+                    self.stdscr.clrtoeol()
+                    self.safe_addstr(input_y, 2, "> " + "*" * len(chars))
+                    self.stdscr.move(input_y, min(4 + len(chars), self.width - 1))
+                    self.stdscr.refresh()
         finally:
-            # Reinitialize curses
-            self.stdscr = curses.initscr()
-            curses.noecho()
-            curses.cbreak()
-            self.stdscr.keypad(True)
-            curses.curs_set(0)
+            curses.curs_set(0)  # Hide cursor
     
     def show_confirmation(self, title, message, default=True, step=None, total_steps=None):
         """Show yes/no confirmation dialog"""
         options = ["Yes", "No"]
         selected = 0 if default else 1
         
+        # The message only needs re-wrapping when the width changes
+        lines = textwrap.wrap(message, self.width - 4)
+        
         while True:
             self.draw_header(title, step, total_steps)
             
             # Draw message
             start_y = 4
-            lines = textwrap.wrap(message, self.width - 4)
             for i, line in enumerate(lines):
                 self.safe_addstr(start_y + i, 2, line)
             
@@ -233,6 +332,9 @@ class TUI:
                 selected += 1
             elif key == ord('\n'):
                 return selected == 0
+            elif key == curses.KEY_RESIZE:
+                self.handle_resize()
+                lines = textwrap.wrap(message, self.width - 4)
             elif key == ord('q') or key == 27:  # ESC
                 return False
     
@@ -240,23 +342,61 @@ class TUI:
         """Show progress screen with steps"""
         self.draw_header(title, step, total_steps)
         
-        start_y = 4
+        self.progress_start_y = 4
         for i, (step_desc, status) in enumerate(steps):
-            y = start_y + i
-            
-            if status == "completed":
-                self.safe_addstr(y, 2, "✓ ", curses.color_pair(3))
-            elif status == "current":
-                self.safe_addstr(y, 2, "▶ ", curses.color_pair(6))
-            elif status == "error":
-                self.safe_addstr(y, 2, "✗ ", curses.color_pair(4))
-            else:
-                self.safe_addstr(y, 2, "  ")
-            
-            self.safe_addstr(y, 4, step_desc)
+            self.draw_step_row(self.progress_start_y + i, step_desc, status)
         
+        # Command output streams into the area below the steps
+        self.log_start_y = self.progress_start_y + len(steps) + 1
+        self.draw_log()
         self.stdscr.refresh()
     
+    def draw_step_row(self, y, step_desc, status):
+        """Draw a single progress step row with one write
+        
+        Glyph and description share the status color, and the text is
+        padded to the line width so it also blanks whatever was there.
+        """
+        glyph, pair = STEP_STATUS_STYLES.get(status, (" ", 0))
+        self.safe_addstr(y, 2, f"{glyph} {step_desc}".ljust(self.width), curses.color_pair(pair))
+    
+    def begin_progress(self, title, steps, step=None, total_steps=None):
+        """Draw a progress screen and return a handle for row-level updates"""
+        self.show_progress(title, steps, step, total_steps)
+        return ProgressPanel(self, steps, self.progress_start_y)
+    
+    def draw_log(self):
+        """Draw the most recent log lines below the progress steps"""
+        if self.log_start_y is None:
+            return
+        
+        visible = self.height - 2 - self.log_start_y
+        if visible <= 0:
+            return
+        
+        lines = list(self.log_lines)[-visible:]
+        for i in range(visible):
+            y = self.log_start_y + i
+            self.stdscr.move(y, 0)
+            self.stdscr.clrtoeol()
+            if i < len(lines):
+                self.safe_addstr(y, 2, lines[i], curses.A_DIM)
+    
+    def append_log(self, line):
+        """Append a line of command output to the progress screen log"""
+        self.log_lines.append(line)
+        if self.stdscr and self.log_start_y is not None:
+            self.draw_log()
+            self.stdscr.refresh()
+    
+    def wait_key(self, timeout_ms):
+        """Wait up to timeout_ms for a keypress, returning the key or -1"""
+        self.stdscr.timeout(timeout_ms)
+        try:
+            return self.stdscr.getch()
+        finally:
+            self.stdscr.timeout(-1)
+    
     def show_info_screen(self, title, lines, step=None, total_steps=None, wait_for_key=True):
         """Show information screen"""
         self.draw_header(title, step, total_steps)
@@ -267,21 +407,21 @@ class TUI:
                 break
             
             # Handle colored lines with status colors
-            if line.startswith("SUCCESS: "):
-                self.safe_addstr(start_y + i, 2, line[9:], curses.color_pair(3))
-            elif line.startswith("ERROR: "):
-                self.safe_addstr(start_y + i, 2, line[7:], curses.color_pair(4))
-            elif line.startswith("WARNING: "):
-                self.safe_addstr(start_y + i, 2, line[9:], curses.color_pair(5))
-            elif line.startswith("INFO: "):
-                self.safe_addstr(start_y + i, 2, line[6:], curses.color_pair(6))
+            prefix, separator, text = line.partition(": ")
+            pair = STATUS_COLOR_PAIRS.get(prefix) if separator else None
+            if pair:
+                self.safe_addstr(start_y + i, 2, text, curses.color_pair(pair))
             else:
                 self.safe_addstr(start_y + i, 2, line)
         
         if wait_for_key:
             self.draw_footer("Press any key to continue...")
             self.stdscr.refresh()
-            self.stdscr.getch()
+            
+            # A resize is not a keypress; redraw at the new size and keep waiting
+            if self.stdscr.getch() == curses.KEY_RESIZE:
+                self.handle_resize()
+                self.show_info_screen(title, lines, step, total_steps, wait_for_key)
         else:
             self.stdscr.refresh()
     
@@ -5,6 +5,17 @@ Input validation utilities for Arch Linux installer
 
 import re
 
+# Patterns are compiled once at import; the validators run on every entry
+HOSTNAME_RE = re.compile(r'^[a-zA-Z0-9-]+$')
+USERNAME_RE = re.compile(r'^[a-z0-9_-]+$')
+TIMEZONE_RE = re.compile(r'^[A-Za-z_]+/[A-Za-z_]+$')
+LOCALE_RE = re.compile(r'^[a-z]{2}_[A-Z]{2}\.UTF-8$')
+
+# Every validator returns (ok, message); successful checks share this tuple
+VALID = (True, "")
+
+RESERVED_USERNAMES = frozenset(['root', 'bin', 'daemon', 'adm', 'lp', 'sync', 'shutdown', 'halt', 'mail'])
+
 
 def validate_hostname(hostname):
     """Validate hostname according to RFC standards"""
@@ -18,10 +29,10 @@ def validate_hostname(hostname):
         return False, "Hostname cannot start or end with hyphen"
     
     # Only allow alphanumeric characters and hyphens
-    if not re.match(r'^[a-zA-Z0-9-]+$', hostname):
+    if not HOSTNAME_RE.match(hostname):
         return False, "Hostname can only contain letters, numbers, and hyphens"
     
-    return True, ""
+    return VALID
 
 
 def validate_username(username):
@@ -36,15 +47,14 @@ def validate_username(username):
         return False, "Username cannot start with hyphen or number"
     
     # Only allow lowercase letters, numbers, underscores, and hyphens
-    if not re.match(r'^[a-z0-9_-]+$', username):
+    if not USERNAME_RE.match(username):
         return False, "Username can only contain lowercase letters, numbers, underscores, and hyphens"
     
     # Check for reserved usernames
-    reserved = ['root', 'bin', 'daemon', 'adm', 'lp', 'sync', 'shutdown', 'halt', 'mail']
-    if username in reserved:
+    if username in RESERVED_USERNAMES:
         return False, f"Username '{username}' is reserved"
     
-    return True, ""
+    return VALID
 
 
 def validate_password(password):
@@ -59,7 +69,7 @@ def validate_password(password):
     # if not re.search(r'[A-Z]', password):
     #     return False, "Password must contain at least one uppercase letter"
     
-    return True, ""
+    return VALID
 
 
 def validate_timezone(timezone):
@@ -68,10 +78,10 @@ def validate_timezone(timezone):
         return False, "Timezone cannot be empty"
     
     # Basic timezone format validation (e.g., "America/New_York")
-    if not re.match(r'^[A-Za-z_]+/[A-Za-z_]+$', timezone):
+    if not TIMEZONE_RE.match(timezone):
         return False, "Timezone must be in format 'Region/City' (e.g., 'America/New_York')"
     
-    return True, ""
+    return VALID
 
 
 def validate_locale(locale):
@@ -80,10 +90,10 @@ def validate_locale(locale):
         return False, "Locale cannot be empty"
     
     # Basic locale format validation (e.g., "en_US.UTF-8")
-    if not re.match(r'^[a-z]{2}_[A-Z]{2}\.UTF-8$', locale):
+    if not LOCALE_RE.match(locale):
         return False, "Locale must be in format 'xx_YY.UTF-8' (e.g., 'en_US.UTF-8')"
     
-    return True, ""
+    return VALID
 
 
 def validate_disk_path(disk_path):
@@ -94,4 +104,4 @@ def validate_disk_path(disk_path):
     if not disk_path.startswith('/dev/'):
         return False, "Disk path must start with '/dev/'"
     
-    return True, ""
\ No newline at end of file
+    return VALID
\ No newline at end of file